@@ -1,16 +1,27 @@
+import aiohttp
 import discord
 from discord.ext import commands
 from discord.ext.commands import CommandNotFound, CheckFailure
 import pomice
 import asyncio
+import copy
+import functools
+import heapq
+import html
 import time
 import math
 import os
+import random
+import re
+import unicodedata
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
 from io import BytesIO
-from urllib.parse import urlparse
+from urllib.parse import parse_qs, unquote, urlparse
 from PIL import Image, ImageDraw, ImageFont
-import requests
 import aiosqlite
+import requests
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
 from dotenv import load_dotenv
@@ -24,15 +35,33 @@ SPOTIFY_CLIENT_ID       = os.getenv("SPOTIFY_CLIENT_ID")
 SPOTIFY_CLIENT_SECRET   = os.getenv("SPOTIFY_CLIENT_SECRET")
 LAVALINK_URI            = os.getenv("LAVALINK_URI")
 LAVALINK_PASSWORD       = os.getenv("LAVALINK_PASSWORD")
+LAVALINK_NODES          = os.getenv("LAVALINK_NODES", "")  # kommaseparert: https://passord@host:443#region,... (overstyrer LAVALINK_URI)
 LAVALINK_RESUME_KEY     = os.getenv("LAVALINK_RESUME_KEY", "onalbot-session")
 LAVALINK_RESUME_TIMEOUT = int(os.getenv("LAVALINK_RESUME_TIMEOUT", "120"))  # sekunder
+LAVALINK_FAILOVER_TIMEOUT = int(os.getenv("LAVALINK_FAILOVER_TIMEOUT", "300"))  # sekunder en spiller venter på en frisk node før den stoppes
 FONT_PATH               = os.getenv("FONT_PATH", os.path.join(BASE_DIR, "arial.ttf"))
 ALLOWED_GUILD_IDS_ENV   = os.getenv("ALLOWED_GUILD_IDS")
 APPLE_MUSIC_COUNTRY     = os.getenv("APPLE_MUSIC_COUNTRY", "NO")  # Default landkode for Apple Music lookup
 WELCOME_GUILD_ID        = int(os.getenv("WELCOME_GUILD_ID", "0"))  # Kun denne serveren får welcome-bilde (0 = deaktivert)
 PAUSE_DISCONNECT_TIMEOUT = int(os.getenv("PAUSE_DISCONNECT_TIMEOUT", "3600"))  # sekunder pauset før auto-stop
+PROGRESS_MODE            = os.getenv("PROGRESS_MODE", "bar").strip().lower()  # "bar" = progress-linje, "timestamp" = Discord-tidsstempler uten løpende redigering
 VOICE_CONNECT_TIMEOUT    = float(os.getenv("VOICE_CONNECT_TIMEOUT", "30"))  # sekunder før voice connect timeout
 DEFAULT_VOLUME           = int(os.getenv("DEFAULT_VOLUME", "100"))  # 0-1000 (Lavalink), 100 er normalt
+MEMORY_CACHE_SIZE        = int(os.getenv("MEMORY_CACHE_SIZE", "2048"))  # maks antall oppslag per tabell i minnet
+MEMORY_CACHE_TTL         = float(os.getenv("MEMORY_CACHE_TTL", "0"))  # sekunder, 0 = ingen utløp
+CACHE_MAX_ROWS           = int(os.getenv("CACHE_MAX_ROWS", "50000"))  # maks rader per cache-tabell på disk, 0 = ingen grense
+CACHE_EVICT_INTERVAL     = int(os.getenv("CACHE_EVICT_INTERVAL", "600"))  # sekunder mellom opprydding av disk-cachen
+NEGATIVE_CACHE_TTL       = int(os.getenv("NEGATIVE_CACHE_TTL", "900"))  # sekunder et mislykket oppslag huskes, 0 = av
+RESOLVE_CONCURRENCY      = max(1, int(os.getenv("RESOLVE_CONCURRENCY", "5")))  # samtidige Lavalink-søk ved spillelisteimport
+SEARCH_CACHE_TTL         = int(os.getenv("SEARCH_CACHE_TTL", "604800"))  # sekunder et fritekstsøk regnes som ferskt, 0 = alltid
+PREFETCH_AHEAD           = max(1, int(os.getenv("PREFETCH_AHEAD", "3")))  # antall uoppløste køelementer som slås opp på forhånd
+SPOTIFY_MAX_IMPORT       = int(os.getenv("SPOTIFY_MAX_IMPORT", "5000"))  # maks spor fra én spilleliste/album, 0 = ingen grense
+SPOTIFY_MAX_WORKERS      = max(1, int(os.getenv("SPOTIFY_MAX_WORKERS", "4")))  # tråder for synkrone spotipy-kall
+SPOTIFY_MAX_RETRIES      = int(os.getenv("SPOTIFY_MAX_RETRIES", "4"))  # nye forsøk ved 429/5xx fra Spotify
+HTTP_MAX_CONNECTIONS     = max(1, int(os.getenv("HTTP_MAX_CONNECTIONS", "20")))  # samtidige utgående HTTP-forbindelser
+HTTP_TIMEOUT             = float(os.getenv("HTTP_TIMEOUT", "10"))  # sekunder per HTTP-forespørsel
+QUEUE_RESTORE            = os.getenv("QUEUE_RESTORE", "1") != "0"  # gjenoppta lagrede køer ved oppstart
+QUEUE_POSITION_INTERVAL  = int(os.getenv("QUEUE_POSITION_INTERVAL", "15"))  # sekunder mellom lagring av avspillingsposisjon
 ALLOWED_GUILD_IDS       = []
 if ALLOWED_GUILD_IDS_ENV:
     for part in ALLOWED_GUILD_IDS_ENV.split(','):
@@ -40,20 +69,53 @@ if ALLOWED_GUILD_IDS_ENV:
         if part.isdigit():
             ALLOWED_GUILD_IDS.append(int(part))
 
+PROGRESS_MODES = ("bar", "timestamp")
+if PROGRESS_MODE not in PROGRESS_MODES:
+    print(f"[Progress] Ukjent PROGRESS_MODE '{PROGRESS_MODE}' (gyldige: {', '.join(PROGRESS_MODES)}), bruker 'bar'.")
+    PROGRESS_MODE = "bar"
+
+
+def spotify_client(**kwargs) -> spotipy.Spotify:
+    # Egen requests-session uten urllib3-retries: spotipy sine retries sover i tråden, og med
+    # status_retries=0 blir en 429 til RetryError uten headere. Slik kommer selve svaret (med
+    # Retry-After) tilbake i SpotifyException, og backoff håndteres i spotify_call.
+    return spotipy.Spotify(requests_session=requests.Session(), requests_timeout=10, **kwargs)
+
+
 sp = None
 if SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET:
     try:
-        sp = spotipy.Spotify(auth_manager=SpotifyClientCredentials(
-            client_id=SPOTIFY_CLIENT_ID,
-            client_secret=SPOTIFY_CLIENT_SECRET
-        ))
+        sp = spotify_client(
+            auth_manager=SpotifyClientCredentials(
+                client_id=SPOTIFY_CLIENT_ID,
+                client_secret=SPOTIFY_CLIENT_SECRET
+            ),
+        )
     except Exception as e:
         print(f"Spotify init error: {e}")
 DB_PATH = os.path.join(BASE_DIR, "music_cache.db")
-bot = commands.Bot(command_prefix="!", intents=discord.Intents.all())
-LAVALINK_NODE_ID = "onalbot"
+
+
+class OnalBot(commands.Bot):
+    async def close(self):
+        try:
+            await super().close()
+        finally:
+            _spotify_executor.shutdown(wait=False, cancel_futures=True)
+            await close_http_session()
+            try:
+                await queue_store.close()
+            except Exception as e:
+                print(f"[Kø] Klarte ikke lagre køen: {e}")
+            await shutdown_cache()
+
+
+bot = OnalBot(command_prefix="!", intents=discord.Intents.all())
+LAVALINK_NODE_ID = "onalbot"  # prefiks, nodene heter onalbot-1, onalbot-2, ...
+LAVALINK_PING_MAX_AGE = 60  # sekunder en ping-måling brukes ved plassering av spillere
 POMICE_NO_NODES = getattr(pomice.exceptions, "NoNodesAvailable", Exception)
 POMICE_NODE_EXCEPTION = getattr(pomice.exceptions, "NodeException", Exception)
+POMICE_NODE_UNAVAILABLE = getattr(pomice.exceptions, "NodeNotAvailable", Exception)
 POMICE_TRACK_LOAD_ERROR = getattr(pomice.exceptions, "TrackLoadError", Exception)
 
 
@@ -71,8 +133,216 @@ def _parse_lavalink_uri(uri: str) -> tuple[str, int, bool]:
     return host, port, secure
 
 
-def get_lavalink_node():
-    return pomice.NodePool.get_node(identifier=LAVALINK_NODE_ID)
+class LavalinkNodeConfig:
+    __slots__ = ("identifier", "host", "port", "secure", "password", "region")
+
+    def __init__(self, identifier: str, host: str, port: int, secure: bool, password: str, region: str | None):
+        self.identifier = identifier
+        self.host = host
+        self.port = port
+        self.secure = secure
+        self.password = password
+        self.region = region
+
+
+def parse_lavalink_nodes(value: str, default_password: str | None) -> list[LavalinkNodeConfig]:
+    """'https://passord@host:443#europe,http://host2:2333' -> én config per node. Passord og region er valgfrie."""
+    configs = []
+    for raw in value.split(","):
+        raw = raw.strip()
+        if not raw:
+            continue
+        parsed = urlparse(raw if "://" in raw else f"http://{raw}")
+        host, port, secure = _parse_lavalink_uri(raw)
+        password = unquote(parsed.password or parsed.username or "") or default_password
+        if not password:
+            raise ValueError(f"Lavalink-node {host}:{port} mangler passord.")
+        region = parsed.fragment.strip().lower() or None
+        configs.append(LavalinkNodeConfig(f"{LAVALINK_NODE_ID}-{len(configs) + 1}", host, port, secure, password, region))
+    return configs
+
+
+def lavalink_node_configs() -> list[LavalinkNodeConfig]:
+    if LAVALINK_NODES.strip():
+        return parse_lavalink_nodes(LAVALINK_NODES, LAVALINK_PASSWORD)
+    if LAVALINK_URI and LAVALINK_PASSWORD:
+        return parse_lavalink_nodes(LAVALINK_URI, LAVALINK_PASSWORD)
+    return []
+
+
+lavalink_regions: dict[str, str | None] = {}  # node-id -> region fra konfigurasjonen
+node_pings: dict[str, tuple[float, float]] = {}  # node-id -> (ping i ms, målt monotonic)
+_ping_task: asyncio.Task | None = None
+
+
+def lavalink_nodes() -> list:
+    """Alle tilkoblede noder i poolen."""
+    return [node for node in pomice.NodePool._nodes.values() if node._available and node.is_connected]
+
+
+def node_penalty(node) -> float:
+    """Belastning for en node, lavere er bedre. Samme straffer som Lavalink-klientene bruker, pluss ping."""
+    stats = getattr(node, "stats", None)
+    # Stats kommer bare hvert minutt; spillere vi nettopp har plassert telles lokalt.
+    players = max(_stat_value(stats, "players_active") or 0, len(node.players))
+    cpu_load = _stat_value(stats, "cpu_system_load") or 0
+    penalty = players + 1.05 ** (100 * cpu_load) * 10 - 10
+    # pomice 2.x tar ikke vare på frameStats; brukes når de finnes.
+    deficit = _stat_value(stats, "frame_stats", "deficit")
+    nulled = _stat_value(stats, "frame_stats", "nulled")
+    if deficit:
+        penalty += 1.03 ** (500 * deficit / 3000) * 600 - 600
+    if nulled:
+        penalty += (1.03 ** (500 * nulled / 3000) * 300 - 300) * 2
+    ping = node_pings.get(node._identifier)
+    if ping:
+        penalty += ping[0] / 10
+    return penalty
+
+
+def refresh_node_pings():
+    # node.latency er en blokkerende TCP-ping, så den måles i bakgrunnen og leses fra node_pings.
+    global _ping_task
+    if _ping_task and not _ping_task.done():
+        return
+    now = time.monotonic()
+    stale = [
+        node for node in lavalink_nodes()
+        if now - node_pings.get(node._identifier, (0, -LAVALINK_PING_MAX_AGE))[1] >= LAVALINK_PING_MAX_AGE
+    ]
+    if stale:
+        _ping_task = asyncio.create_task(_measure_node_pings(stale))
+
+
+async def _measure_node_pings(nodes):
+    for node in nodes:
+        try:
+            ping = await asyncio.to_thread(getattr, node, "latency")
+            node_pings[node._identifier] = (float(ping), time.monotonic())
+        except Exception as e:
+            print(f"[Lavalink] Ping mot {node._identifier} feilet: {e}")
+
+
+def pick_lavalink_node(region: str | None = None):
+    """Den minst belastede noden, helst i samme region som voice-kanalen."""
+    nodes = lavalink_nodes()
+    if not nodes:
+        raise POMICE_NO_NODES("Ingen Lavalink-noder er tilgjengelige.")
+    if region:
+        local = [node for node in nodes if lavalink_regions.get(node._identifier) == str(region).lower()]
+        nodes = local or nodes
+    refresh_node_pings()
+    return min(nodes, key=node_penalty)
+
+
+class OnalPlayer(pomice.Player):
+    """pomice.Player som legges på den minst belastede Lavalink-noden i stedet for en tilfeldig."""
+
+    def __init__(self, client, channel, *, node=None):
+        super().__init__(client, channel, node=node or pick_lavalink_node(getattr(channel, "rtc_region", None)))
+        self.lost_at: float | None = None  # monotonic da noden falt ut, None = alt i orden
+        self.lost_position = 0
+
+    @property
+    def position(self) -> float:
+        # Mens spilleren venter på en ny node står sporet stille på sist kjente posisjon.
+        if self.lost_at is not None:
+            return self.lost_position
+        return super().position
+
+    async def destroy(self, *, force: bool = False):
+        # pomice ødelegger alle spillere når nodens websocket lukkes. Da beholdes spilleren og voice-tilkoblingen,
+        # og node_watchdog flytter den til en frisk node (eller samme node når den er tilbake).
+        if not force and not self.node.is_connected:
+            if self.lost_at is None:
+                self.lost_position = int(super().position)
+                self.lost_at = time.monotonic()
+            node_watchdog.strand(self)
+            return
+        node_watchdog.forget(self)
+        await super().destroy()
+
+    async def move_to_node(self, node):
+        """Flytt spilleren til node og fortsett sporet fra sist kjente posisjon."""
+        self._node._players.pop(self.guild.id, None)
+        self._node = node
+        node._players[self.guild.id] = self
+        await self._refresh_endpoint_uri(node._session_id)
+        await self._dispatch_voice_update()
+        track, paused = self.current, self._paused
+        if track:
+            await self.play(track, start=0 if track.is_stream else self.lost_position)
+            # Til første playerUpdate fra den nye noden regner pomice posisjonen fra disse;
+            # ellers hopper den fram like lenge som noden var borte.
+            self._last_position = self.lost_position
+            self._last_update = time.time() * 1000
+            if paused:
+                await self.set_pause(True)
+        await self.set_volume(self.volume)
+        self.lost_at = None
+
+
+LAVALINK_FAILOVER_RETRY = 2.0  # sekunder mellom forsøk på å flytte spillere
+
+
+class NodeWatchdog:
+    """Flytter spillere fra en Lavalink-node som har falt ut, så køen og now playing overlever."""
+
+    def __init__(self):
+        self._stranded: dict[int, OnalPlayer] = {}  # guild.id -> spiller uten node
+        self._task: asyncio.Task | None = None
+        self.migrated = 0
+        self.failed = 0
+
+    def strand(self, player: OnalPlayer):
+        self._stranded[player.guild.id] = player
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def forget(self, player: OnalPlayer):
+        if self._stranded.get(player.guild.id) is player:
+            del self._stranded[player.guild.id]
+
+    async def _run(self):
+        while self._stranded:
+            for guild_id, player in list(self._stranded.items()):
+                if self._stranded.get(guild_id) is player:
+                    await self._migrate(guild_id, player)
+            if self._stranded:
+                await asyncio.sleep(LAVALINK_FAILOVER_RETRY)
+
+    async def _migrate(self, guild_id: int, player: OnalPlayer):
+        current = track_data.get(guild_id)
+        try:
+            node = pick_lavalink_node(getattr(player.channel, "rtc_region", None))
+            await player.move_to_node(node)
+        except Exception as e:
+            if time.monotonic() - player.lost_at < LAVALINK_FAILOVER_TIMEOUT:
+                return  # prøv igjen neste runde; noden kan komme tilbake
+            print(f"[Lavalink] Ga opp å flytte spilleren i {player.guild.name}: {e}")
+            self.forget(player)
+            self.failed += 1
+            if current:
+                minutes = max(1, LAVALINK_FAILOVER_TIMEOUT // 60)
+                await stop_and_clear(
+                    current[1],
+                    notify=f"⏹️ Spiller stoppet: ingen Lavalink-node svarte på {minutes} min.",
+                )
+            else:
+                await player.destroy(force=True)
+            return
+        self.forget(player)
+        self.migrated += 1
+        print(f"[Lavalink] Flyttet spilleren i {player.guild.name} til {node._identifier}.")
+        if current:
+            progress_scheduler.poke(guild_id)
+            try:
+                await current[1].send(f"🔁 Lavalink-noden falt ut, fortsetter på {node._identifier}.", delete_after=8)
+            except Exception:
+                pass
+
+
+node_watchdog = NodeWatchdog()
 
 
 def resolve_player(guild: discord.Guild | None):
@@ -83,67 +353,320 @@ def resolve_player(guild: discord.Guild | None):
     if isinstance(vc, pomice.Player) and not getattr(vc, "is_dead", False):
         return vc
 
-    try:
-        node = get_lavalink_node()
-    except POMICE_NO_NODES:
+    for node in lavalink_nodes():
+        player = node.get_player(guild.id)
+        if player and not getattr(player, "is_dead", False):
+            return player
+    return None
+
+
+class SingleFlight:
+    """Slår sammen samtidige like oppslag: alle som ber om samme nøkkel deler ett kall og ett svar."""
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.saved = 0
+
+    async def do(self, key: str, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.saved += 1
+        # shield: en kaller som avbrytes skal ikke avbryte oppslaget for de andre.
+        return await asyncio.shield(task)
+
+
+lookups = SingleFlight()  # deles av Lavalink-, Spotify- og iTunes-oppslag
+
+
+# --- Kanoniske nøkler ---
+# Samme sang kan skrives på mange måter (youtu.be/X, m.youtube.com/watch?v=X&si=..., "Artist - Tittel (Official Video)").
+# Alle cache- og sammenslåingsoppslag går via canonical_query, så skrivemåten ikke gir bom.
+YOUTUBE_ID_RE = re.compile(r"^[\w-]{11}$")
+YOUTUBE_PATH_KINDS = ("shorts", "embed", "live", "v")
+SPOTIFY_KINDS = ("track", "album", "playlist", "artist")
+BARE_URL_RE = re.compile(r"^(?:[\w-]+\.)+[a-z]{2,}/", re.I)
+SEARCH_NOISE_RE = re.compile(
+    r"\b(?:official\s+(?:music\s+|lyric\s+|hd\s+)?(?:video|audio|visuali[sz]er)|music\s+video|lyric\s+video)\b"
+    r"|[(\[](?:hd|hq|4k|audio|lyrics?)[)\]]",
+    re.I,
+)
+SEARCH_APOSTROPHE_RE = re.compile(r"['’`´]")
+SEARCH_PUNCTUATION_RE = re.compile(r"[^\w\s]|_")
+
+
+def parse_media_url(query: str) -> tuple[str, str] | None:
+    """Gjør en støttet lenke om til (kilde, id), f.eks. ('youtube', 'dQw4w9WgXcQ') eller ('spotify:track', '...')."""
+    query = query.strip()
+    if query.startswith("spotify:"):
+        parts = query.split(":")
+        if len(parts) == 3 and parts[1] in SPOTIFY_KINDS and parts[2]:
+            return f"spotify:{parts[1]}", parts[2]
         return None
-    except Exception:
+    if not urlparse(query).scheme and BARE_URL_RE.match(query):
+        query = f"https://{query}"
+    url = urlparse(query)
+    if url.scheme not in ("http", "https"):
+        return None
+    host = url.netloc.lower().rsplit("@", 1)[-1].split(":")[0].removeprefix("www.")
+    segments = [segment for segment in url.path.split("/") if segment]
+    params = parse_qs(url.query)
+
+    if host == "youtu.be" or host.endswith(("youtube.com", "youtube-nocookie.com")):
+        if host == "youtu.be":
+            video_id = segments[0] if segments else None
+        elif len(segments) >= 2 and segments[0] in YOUTUBE_PATH_KINDS:
+            video_id = segments[1]
+        else:
+            video_id = params.get("v", [None])[0]
+        playlist_id = params.get("list", [None])[0]
+        if playlist_id:
+            return "youtube:playlist", playlist_id
+        if video_id and YOUTUBE_ID_RE.match(video_id):
+            return "youtube", video_id
+        return None
+
+    if host == "open.spotify.com":
+        if segments and segments[0].startswith("intl-"):
+            segments = segments[1:]
+        if len(segments) >= 2 and segments[0] in SPOTIFY_KINDS:
+            return f"spotify:{segments[0]}", segments[1]
         return None
 
-    player = node.get_player(guild.id)
-    if player and not getattr(player, "is_dead", False):
-        return player
+    if host == "music.apple.com":
+        apple_link = APPLE_MUSIC_RE.search(query)
+        if not apple_link:
+            return None
+        _, kind, collection_id = apple_link.groups()
+        # Albumlenker med ?i=<id> peker på én sang i albumet.
+        song_id = params.get("i", [None])[0]
+        if song_id or kind == "song":
+            return "apple:song", song_id or collection_id
+        return f"apple:{kind}", collection_id
     return None
 
 
+def normalize_search_text(text: str) -> str:
+    """Små bokstaver, uten tegnsetting, doble mellomrom og støy som '(Official Video)'."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    cleaned = SEARCH_NOISE_RE.sub(" ", SEARCH_APOSTROPHE_RE.sub("", text))
+    cleaned = " ".join(SEARCH_PUNCTUATION_RE.sub(" ", cleaned).split())
+    # Et søk som bare består av tegnsetting/støy beholdes heller enn å bli tomt.
+    return cleaned or " ".join(text.split())
+
+
+def canonical_query(query: str) -> str:
+    """Kanonisk nøkkel: lenker blir 'kilde:id', fritekst blir 'ytsearch:<normalisert tekst>'."""
+    media = parse_media_url(query)
+    if media:
+        return ":".join(media)
+    query = query.strip()
+    if urlparse(query).scheme in ("http", "https"):
+        return query  # andre lenker (SoundCloud o.l.) brukes som de er
+    prefix = next((p for p in SEARCH_PREFIXES if query.startswith(p)), None)
+    if prefix:
+        query = query[len(prefix):]
+    return f"{prefix or 'ytsearch:'}{normalize_search_text(query)}"
+
+
+def lavalink_query(search: str, key: str) -> str:
+    # Det Lavalink skal slå opp: video-ID-er blir vanlige watch-lenker, ellers søkes det på teksten slik
+    # den kom inn. Den normaliserte nøkkelen mister tegn ("P!nk", "AC/DC", "C++") og er bare til cachen.
+    if key.startswith("youtube:") and YOUTUBE_ID_RE.match(key[len("youtube:"):]):
+        return f"https://www.youtube.com/watch?v={key[len('youtube:'):]}"
+    return search.strip()
+
+
+def metadata_search(title: str, artist: str) -> str:
+    return f"ytsearch:{title} {artist}".strip()
+
+
+async def fetch_tracks_shared(query: str, *, ctx=None):
+    """Som fetch_tracks, men like søk som pågår samtidig deler ett Lavalink-kall. Hver kaller får egne Track-kopier."""
+    result = await lookups.do(f"lavalink:{canonical_query(query)}", lambda: fetch_tracks(query))
+    if not result or hasattr(result, "tracks"):
+        return result
+    tracks = [copy.copy(track) for track in result]
+    for track in tracks:
+        track.ctx = ctx
+        track.requester = getattr(ctx, "author", None)
+    return tracks
+
+
+SEARCH_PREFIXES = ("ytsearch:", "ytmsearch:", "scsearch:", "spsearch:", "sprec:", "amsearch:")
+
+
 async def fetch_tracks(query: str, *, ctx=None):
-    node = get_lavalink_node()
     is_url = bool(urlparse(query).scheme)
-    has_search_prefix = query.startswith(("ytsearch:", "ytmsearch:", "scsearch:", "spsearch:", "sprec:", "amsearch:"))
+    has_search_prefix = query.startswith(SEARCH_PREFIXES)
     if not is_url and not has_search_prefix:
         query = f"ytsearch:{query}"
-    return await node.get_tracks(query=query, ctx=ctx, search_type=None)
+    # Søk går til den minst belastede noden; faller en node ut midt i, prøves neste.
+    nodes = sorted(lavalink_nodes(), key=node_penalty)
+    if not nodes:
+        raise POMICE_NO_NODES("Ingen Lavalink-noder er tilgjengelige.")
+    for node in nodes[:-1]:
+        try:
+            return await node.get_tracks(query=query, ctx=ctx, search_type=None)
+        except (POMICE_NODE_EXCEPTION, POMICE_NODE_UNAVAILABLE, aiohttp.ClientError, OSError) as e:
+            print(f"[Lavalink] Søk feilet på {node._identifier}, prøver neste node: {e}")
+    return await nodes[-1].get_tracks(query=query, ctx=ctx, search_type=None)
+
+
+LAVALINK_STREAM_LENGTH = 2**63 - 1  # Lavalink oppgir Long.MAX som lengde på direktesendinger
+
+
+def cached_length(track) -> int | None:
+    # Lengden som lagres i youtube_cache; NULL betyr direktesending, som i QueueEntry.
+    return None if track.is_stream else int(track.length or 0)
+
+
+def build_cached_track(row, *, ctx=None):
+    # Bygg en spillbar Track lokalt fra den lagrede base64-strengen, uten Lavalink-oppslag.
+    yt_title, yt_url, yt_track, yt_length, yt_identifier, _cached_at = row
+    if not yt_track:
+        return None
+    # Rader lagret før strømmarkøren fantes har Long.MAX som lengde.
+    is_stream = yt_length is None or yt_length >= LAVALINK_STREAM_LENGTH
+    info = {
+        "title": yt_title or "Ukjent sang",
+        "author": "",
+        "uri": yt_url or "",
+        "identifier": yt_identifier or "",
+        "length": 0 if is_stream else yt_length,
+        "isStream": is_stream,
+        "isSeekable": not is_stream,
+        "position": 0,
+        "sourceName": "youtube",
+    }
+    return pomice.Track(track_id=yt_track, info=info, ctx=ctx, track_type=pomice.TrackType.YOUTUBE)
+
+
+async def _search_youtube(search: str, cached_row=None, *, ctx=None):
+    # Nettverksdelen av oppslaget: eldre rader uten lagret spor slås opp på URL, ellers søk på nytt.
+    if cached_row and cached_row[1]:
+        tracks = await fetch_tracks_shared(cached_row[1], ctx=ctx)
+        if tracks and not hasattr(tracks, "tracks"):
+            return tracks[0]
+    tracks = await fetch_tracks_shared(search, ctx=ctx)
+    if hasattr(tracks, "tracks"):
+        tracks = tracks.tracks
+    return tracks[0] if tracks else None
+
+
+async def resolve_youtube_search(search: str, *, ctx=None, max_age: int = 0):
+    """Returner en spillbar Track for et ytsearch-søk, helst rett fra cachen.
+
+    Tar også imot YouTube-lenker. Nøkkelen er alltid canonical_query(search); Lavalink får selve teksten.
+    max_age (sekunder) gjør at eldre treff regnes som utdaterte og søkes på nytt.
+    """
+    key = canonical_query(search)
+    cached = await get_youtube_cache(key)
+    if cached and max_age and cached[5] < time.time() - max_age:
+        cached = None
+    track = build_cached_track(cached, ctx=ctx) if cached else None
+    if track:
+        return track
+    if await get_negative_cache(key):
+        return None
+    track = await _search_youtube(lavalink_query(search, key), cached, ctx=ctx)
+    if track:
+        await set_youtube_cache(key, track)
+    else:
+        await set_negative_cache(key, NEGATIVE_NO_MATCH)
+    return track
+
+
+# Felles grense for samtidige søk på tvers av guilds, så en stor import ikke oversvømmer Lavalink.
+_resolve_semaphore = asyncio.Semaphore(RESOLVE_CONCURRENCY)
+
+
+async def iter_youtube_searches(searches: list, *, ctx=None):
+    """Løs opp søk samtidig og gi Track (eller None) i opprinnelig rekkefølge så snart hvert er klart."""
+    keys = [canonical_query(search) for search in searches]
+    cached_rows = await get_youtube_cache_many(keys)
+    new_entries = {}
+
+    async def resolve_one(key, search):
+        row = cached_rows.get(key)
+        track = build_cached_track(row, ctx=ctx) if row else None
+        if track is not None or await get_negative_cache(key):
+            return track
+        try:
+            async with _resolve_semaphore:
+                track = await _search_youtube(lavalink_query(search, key), row, ctx=ctx)
+        except Exception as e:
+            print(f"[Cache] Oppslag feilet for {key!r}: {e}")
+            return None
+        if track:
+            new_entries[key] = track
+        else:
+            await set_negative_cache(key, NEGATIVE_NO_MATCH)
+        return track
+
+    # Søk med samme nøkkel slås opp én gang, med teksten til det første av dem.
+    first_searches = {}
+    for key, search in zip(keys, searches):
+        first_searches.setdefault(key, search)
+    tasks = {key: asyncio.create_task(resolve_one(key, search)) for key, search in first_searches.items()}
+    try:
+        for key in keys:
+            yield await tasks[key]
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        await set_youtube_cache_many(new_entries)
 
 
 async def connect_lavalink() -> bool:
-    if not LAVALINK_URI or not LAVALINK_PASSWORD:
+    try:
+        configs = lavalink_node_configs()
+    except ValueError as e:
+        print(f"[Lavalink] Ugyldig nodekonfigurasjon: {e}")
+        return False
+    if not configs:
         print("[Lavalink] Mangler URI eller PASS i miljøvariabler.")
         return False
-    try:
-        try:
-            await pomice.NodePool.disconnect()
-        except Exception:
-            pass
 
-        host, port, secure = _parse_lavalink_uri(LAVALINK_URI)
-        node = await pomice.NodePool.create_node(
-            bot=bot,
-            host=host,
-            port=port,
-            password=LAVALINK_PASSWORD,
-            identifier=LAVALINK_NODE_ID,
-            secure=secure,
-            resume_key=LAVALINK_RESUME_KEY,
-            resume_timeout=LAVALINK_RESUME_TIMEOUT,
-        )
-        if not node.is_connected:
-            raise RuntimeError("Node connected flag was false.")
-        print("[Lavalink] Tilkoblet.")
-        return True
-    except Exception as e:
-        print(f"[Lavalink] Kunne ikke koble til: {e}")
+    # Noder som allerede er tilkoblet får være i fred, så spillerne deres ikke rives ned.
+    connected = 0
+    for config in configs:
+        node = pomice.NodePool._nodes.get(config.identifier)
+        try:
+            if node is not None:
+                if not node.is_connected:
+                    await node.connect(reconnect=True)
+                connected += 1
+                continue
+            node = await pomice.NodePool.create_node(
+                bot=bot,
+                host=config.host,
+                port=config.port,
+                password=config.password,
+                identifier=config.identifier,
+                secure=config.secure,
+                resume_key=LAVALINK_RESUME_KEY,
+                resume_timeout=LAVALINK_RESUME_TIMEOUT,
+            )
+            if not node.is_connected:
+                raise RuntimeError("Node connected flag was false.")
+            lavalink_regions[config.identifier] = config.region
+            connected += 1
+        except Exception as e:
+            print(f"[Lavalink] Kunne ikke koble til {config.identifier} ({config.host}:{config.port}): {e}")
+    if not connected:
         return False
+    print(f"[Lavalink] Tilkoblet {connected}/{len(configs)} noder.")
+    refresh_node_pings()
+    return True
 
 
 async def ensure_lavalink_ready() -> bool:
-    try:
-        node = get_lavalink_node()
-        if node and node.is_connected:
-            return True
-    except POMICE_NO_NODES:
-        pass
-    except Exception:
-        pass
+    if lavalink_nodes():
+        return True
     return await connect_lavalink()
 
 
@@ -192,82 +715,1363 @@ async def on_command_error(ctx, error):
     else:
         print(f"Uventet feil: {error}")
 
+# Én langlevd SQLite-tilkobling for cachen i stedet for connect/close per oppslag.
+# aiosqlite kjører hver tilkobling i egen tråd, så dette sparer både tråd og filhåndtak per kall.
+CACHE_DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA busy_timeout=5000",
+)
+cache_db: aiosqlite.Connection | None = None
+_cache_db_open_lock = asyncio.Lock()
+
+
+async def get_cache_db() -> aiosqlite.Connection:
+    global cache_db
+    if cache_db is not None:
+        return cache_db
+    async with _cache_db_open_lock:
+        if cache_db is None:
+            db = await aiosqlite.connect(DB_PATH)
+            for pragma in CACHE_DB_PRAGMAS:
+                await db.execute(pragma)
+            cache_db = db
+    return cache_db
+
+
+async def close_cache_db():
+    global cache_db
+    db, cache_db = cache_db, None
+    if db is None:
+        return
+    try:
+        await db.close()
+    except Exception as e:
+        print(f"[Cache] Feil ved lukking av database: {e}")
+
+
 async def init_cache_db():
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS spotify_cache (
-            spotify_id TEXT PRIMARY KEY,
-            yt_query TEXT NOT NULL
-        );
-        """)
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS youtube_cache (
-            yt_query TEXT PRIMARY KEY,
-            yt_title TEXT,
-            yt_url TEXT
-        );
-        """)
-        await db.commit()
+    db = await get_cache_db()
+    # Inkrementell VACUUM krever auto_vacuum=INCREMENTAL; eldre databaser konverteres én gang.
+    async with db.execute("PRAGMA auto_vacuum") as cursor:
+        auto_vacuum = (await cursor.fetchone())[0]
+    if auto_vacuum != 2:
+        await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        await db.execute("VACUUM")
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS spotify_cache (
+        spotify_id TEXT PRIMARY KEY,
+        yt_query TEXT NOT NULL,
+        last_access INTEGER NOT NULL DEFAULT 0,
+        hit_count INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS youtube_cache (
+        yt_query TEXT PRIMARY KEY,
+        yt_title TEXT,
+        yt_url TEXT,
+        yt_track TEXT,
+        yt_length INTEGER,
+        yt_identifier TEXT,
+        cached_at INTEGER NOT NULL DEFAULT 0,
+        last_access INTEGER NOT NULL DEFAULT 0,
+        hit_count INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+    await _ensure_columns(db, "spotify_cache", {
+        "last_access": "INTEGER NOT NULL DEFAULT 0",
+        "hit_count": "INTEGER NOT NULL DEFAULT 0",
+    })
+    await _ensure_columns(db, "youtube_cache", {
+        "yt_track": "TEXT",
+        "yt_length": "INTEGER",
+        "yt_identifier": "TEXT",
+        "cached_at": "INTEGER NOT NULL DEFAULT 0",
+        "last_access": "INTEGER NOT NULL DEFAULT 0",
+        "hit_count": "INTEGER NOT NULL DEFAULT 0",
+    })
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS recording_cache (
+        isrc TEXT PRIMARY KEY,
+        yt_query TEXT NOT NULL,
+        last_access INTEGER NOT NULL DEFAULT 0,
+        hit_count INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+    # Køer og nåværende spor per guild, så avspillingen kan gjenopptas etter omstart.
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS queue_entries (
+        guild_id INTEGER NOT NULL,
+        seq REAL NOT NULL,
+        encoded TEXT,
+        title TEXT NOT NULL,
+        length INTEGER,
+        identifier TEXT,
+        uri TEXT,
+        requester_id INTEGER,
+        search TEXT,
+        PRIMARY KEY (guild_id, seq)
+    );
+    """)
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS now_playing (
+        guild_id INTEGER PRIMARY KEY,
+        voice_channel_id INTEGER NOT NULL,
+        text_channel_id INTEGER NOT NULL,
+        encoded TEXT NOT NULL,
+        title TEXT NOT NULL,
+        length INTEGER,
+        identifier TEXT,
+        uri TEXT,
+        requester_id INTEGER,
+        position INTEGER NOT NULL DEFAULT 0,
+        updated_at INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+    for table in CACHE_TABLE_KEYS:
+        await db.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_last_access ON {table} (last_access)")
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS negative_cache (
+        cache_key TEXT PRIMARY KEY,
+        reason TEXT NOT NULL,
+        expires_at INTEGER NOT NULL
+    );
+    """)
+    await db.commit()
+
+
+async def _ensure_columns(db: aiosqlite.Connection, table: str, columns: dict):
+    # Enkel migrering: legg til kolonner som mangler i eldre databaser.
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        existing = {row[1] for row in await cursor.fetchall()}
+    for name, definition in columns.items():
+        if name not in existing:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+class LRUCache:
+    """Begrenset minnecache med LRU-utkasting og valgfri TTL (sekunder, 0 = av)."""
+
+    def __init__(self, maxsize: int, ttl: float = 0):
+        self.maxsize = max(0, maxsize)
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        expires_at, value = item
+        if expires_at and expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: float | None = None):
+        if self.maxsize == 0:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl > 0 else 0
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key):
+        item = self._data.pop(key, None)
+        return item[1] if item else None
+
+    def clear(self):
+        self._data.clear()
+
+
+# Minnelaget ligger foran SQLite-tabellene; alle skrivinger går gjennom begge.
+spotify_memory_cache = LRUCache(MEMORY_CACHE_SIZE, MEMORY_CACHE_TTL)
+youtube_memory_cache = LRUCache(MEMORY_CACHE_SIZE, MEMORY_CACHE_TTL)
+disk_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+# Tilgangsstatistikk samles i minnet og skrives i batch av vedlikeholdsoppgaven,
+# slik at et cache-treff aldri koster en ekstra skriving.
+CACHE_TABLE_KEYS = {"spotify_cache": "spotify_id", "youtube_cache": "yt_query", "recording_cache": "isrc"}
+_cache_touches = {table: {} for table in CACHE_TABLE_KEYS}  # table -> key -> (last_access, hits)
+
+
+def _count_disk_lookup(found: bool):
+    disk_cache_stats["hits" if found else "misses"] += 1
+
+
+def _touch_cache(table: str, key):
+    touches = _cache_touches[table]
+    _, hits = touches.get(key, (0, 0))
+    touches[key] = (int(time.time()), hits + 1)
+
 
 async def get_spotify_cache(spotify_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("SELECT yt_query FROM spotify_cache WHERE spotify_id = ?", (spotify_id,)) as cursor:
-            row = await cursor.fetchone()
-            return row[0] if row else None
+    cached = spotify_memory_cache.get(spotify_id)
+    if cached is not None:
+        _touch_cache("spotify_cache", spotify_id)
+        return cached
+    db = await get_cache_db()
+    async with db.execute("SELECT yt_query FROM spotify_cache WHERE spotify_id = ?", (spotify_id,)) as cursor:
+        row = await cursor.fetchone()
+    _count_disk_lookup(row is not None)
+    if not row:
+        return None
+    _touch_cache("spotify_cache", spotify_id)
+    spotify_memory_cache.set(spotify_id, row[0])
+    return row[0]
 
 async def set_spotify_cache(spotify_id, yt_query):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("INSERT OR REPLACE INTO spotify_cache (spotify_id, yt_query) VALUES (?, ?)", (spotify_id, yt_query))
-        await db.commit()
+    spotify_memory_cache.set(spotify_id, yt_query)
+    db = await get_cache_db()
+    await db.execute(
+        "INSERT OR REPLACE INTO spotify_cache (spotify_id, yt_query, last_access) VALUES (?, ?, ?)",
+        (spotify_id, yt_query, int(time.time())),
+    )
+    await db.commit()
 
 async def get_youtube_cache(query):
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("SELECT yt_title, yt_url FROM youtube_cache WHERE yt_query = ?", (query,)) as cursor:
+    # Returnerer (yt_title, yt_url, yt_track, yt_length, yt_identifier, cached_at) eller None.
+    cached = youtube_memory_cache.get(query)
+    if cached is not None:
+        _touch_cache("youtube_cache", query)
+        return cached
+    db = await get_cache_db()
+    async with db.execute(
+        "SELECT yt_title, yt_url, yt_track, yt_length, yt_identifier, cached_at FROM youtube_cache WHERE yt_query = ?",
+        (query,),
+    ) as cursor:
+        row = await cursor.fetchone()
+    _count_disk_lookup(row is not None)
+    if not row:
+        return None
+    row = tuple(row)
+    _touch_cache("youtube_cache", query)
+    youtube_memory_cache.set(query, row)
+    return row
+
+async def set_youtube_cache(query, track):
+    now = int(time.time())
+    row = (track.title, track.uri, track.track_id, cached_length(track), track.identifier, now)
+    youtube_memory_cache.set(query, row)
+    db = await get_cache_db()
+    await db.execute(
+        "INSERT OR REPLACE INTO youtube_cache "
+        "(yt_query, yt_title, yt_url, yt_track, yt_length, yt_identifier, cached_at, last_access) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (query, *row, now),
+    )
+    await db.commit()
+
+# Batch-API for spillelister: ett IN-oppslag per tabell og én executemany per skriving.
+SQLITE_BATCH_SIZE = 500  # godt under SQLites grense for antall parametere
+
+
+def _chunked(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+async def _select_many(sql: str, keys: list) -> list:
+    db = await get_cache_db()
+    rows = []
+    for chunk in _chunked(keys, SQLITE_BATCH_SIZE):
+        placeholders = ",".join("?" * len(chunk))
+        async with db.execute(sql.format(placeholders=placeholders), chunk) as cursor:
+            rows.extend(await cursor.fetchall())
+    return rows
+
+
+async def get_spotify_cache_many(spotify_ids) -> dict:
+    found = {}
+    missing = []
+    for spotify_id in dict.fromkeys(spotify_ids):
+        cached = spotify_memory_cache.get(spotify_id)
+        if cached is not None:
+            found[spotify_id] = cached
+            _touch_cache("spotify_cache", spotify_id)
+        else:
+            missing.append(spotify_id)
+    if missing:
+        rows = await _select_many(
+            "SELECT spotify_id, yt_query FROM spotify_cache WHERE spotify_id IN ({placeholders})", missing
+        )
+        for spotify_id, yt_query in rows:
+            found[spotify_id] = yt_query
+            _touch_cache("spotify_cache", spotify_id)
+            spotify_memory_cache.set(spotify_id, yt_query)
+        disk_cache_stats["hits"] += len(rows)
+        disk_cache_stats["misses"] += len(missing) - len(rows)
+    return found
+
+async def set_spotify_cache_many(entries: dict):
+    if not entries:
+        return
+    for spotify_id, yt_query in entries.items():
+        spotify_memory_cache.set(spotify_id, yt_query)
+    now = int(time.time())
+    db = await get_cache_db()
+    await db.executemany(
+        "INSERT OR REPLACE INTO spotify_cache (spotify_id, yt_query, last_access) VALUES (?, ?, ?)",
+        [(spotify_id, yt_query, now) for spotify_id, yt_query in entries.items()],
+    )
+    await db.commit()
+
+async def get_youtube_cache_many(queries) -> dict:
+    found = {}
+    missing = []
+    for query in dict.fromkeys(queries):
+        cached = youtube_memory_cache.get(query)
+        if cached is not None:
+            found[query] = cached
+            _touch_cache("youtube_cache", query)
+        else:
+            missing.append(query)
+    if missing:
+        rows = await _select_many(
+            "SELECT yt_query, yt_title, yt_url, yt_track, yt_length, yt_identifier, cached_at "
+            "FROM youtube_cache WHERE yt_query IN ({placeholders})",
+            missing,
+        )
+        for query, *row in rows:
+            row = tuple(row)
+            found[query] = row
+            _touch_cache("youtube_cache", query)
+            youtube_memory_cache.set(query, row)
+        disk_cache_stats["hits"] += len(rows)
+        disk_cache_stats["misses"] += len(missing) - len(rows)
+    return found
+
+async def set_youtube_cache_many(entries: dict):
+    # entries: yt_query -> pomice.Track
+    if not entries:
+        return
+    now = int(time.time())
+    rows = []
+    for query, track in entries.items():
+        row = (track.title, track.uri, track.track_id, cached_length(track), track.identifier, now)
+        youtube_memory_cache.set(query, row)
+        rows.append((query, *row, now))
+    db = await get_cache_db()
+    await db.executemany(
+        "INSERT OR REPLACE INTO youtube_cache "
+        "(yt_query, yt_title, yt_url, yt_track, yt_length, yt_identifier, cached_at, last_access) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    await db.commit()
+
+# Identitetsindeks: samme innspilling fra Spotify og Apple Music har samme ISRC,
+# så alle kildelenker for en sang peker på ett og samme YouTube-søk (og dermed én youtube_cache-rad).
+recording_memory_cache = LRUCache(MEMORY_CACHE_SIZE, MEMORY_CACHE_TTL)
+
+
+def normalize_isrc(isrc) -> str | None:
+    isrc = str(isrc or "").replace("-", "").strip().upper()
+    return isrc or None
+
+
+async def get_recording_cache_many(isrcs) -> dict:
+    found = {}
+    missing = []
+    for isrc in dict.fromkeys(isrcs):
+        cached = recording_memory_cache.get(isrc)
+        if cached is not None:
+            found[isrc] = cached
+            _touch_cache("recording_cache", isrc)
+        else:
+            missing.append(isrc)
+    if missing:
+        rows = await _select_many(
+            "SELECT isrc, yt_query FROM recording_cache WHERE isrc IN ({placeholders})",
+            missing,
+        )
+        for isrc, yt_query in rows:
+            found[isrc] = yt_query
+            _touch_cache("recording_cache", isrc)
+            recording_memory_cache.set(isrc, yt_query)
+        disk_cache_stats["hits"] += len(rows)
+        disk_cache_stats["misses"] += len(missing) - len(rows)
+    return found
+
+async def set_recording_cache_many(entries: dict):
+    if not entries:
+        return
+    for isrc, yt_query in entries.items():
+        recording_memory_cache.set(isrc, yt_query)
+    now = int(time.time())
+    db = await get_cache_db()
+    await db.executemany(
+        "INSERT OR IGNORE INTO recording_cache (isrc, yt_query, last_access) VALUES (?, ?, ?)",
+        [(isrc, yt_query, now) for isrc, yt_query in entries.items()],
+    )
+    await db.commit()
+
+async def recording_searches(metas: list) -> list:
+    """Gjør (tittel, artist, isrc) om til YouTube-søk; kjente ISRC-er gjenbruker søket fra første kilde."""
+    isrcs = [normalize_isrc(isrc) for _, _, isrc in metas]
+    known = await get_recording_cache_many([isrc for isrc in isrcs if isrc])
+    searches = []
+    new_recordings = {}
+    for (title, artist, _), isrc in zip(metas, isrcs):
+        search = known.get(isrc) or new_recordings.get(isrc) or metadata_search(title, artist)
+        if isrc and isrc not in known:
+            new_recordings[isrc] = search
+        searches.append(search)
+    await set_recording_cache_many(new_recordings)
+    return searches
+
+async def recording_search(title: str, artist: str, isrc=None) -> str:
+    return (await recording_searches([(title, artist, isrc)]))[0]
+
+# Negativ cache: husk "ingen metadata" / "ingen YouTube-treff" en kort stund,
+# så samme døde lenke ikke koster et nytt nettverksoppslag hver gang.
+NEGATIVE_NO_METADATA = "no_metadata"
+NEGATIVE_NO_MATCH = "no_match"
+negative_memory_cache = LRUCache(MEMORY_CACHE_SIZE, NEGATIVE_CACHE_TTL)
+negative_cache_stats = {"hits": 0, "stored": 0}
+
+
+async def get_negative_cache(cache_key: str) -> str | None:
+    if NEGATIVE_CACHE_TTL <= 0:
+        return None
+    reason = negative_memory_cache.get(cache_key)
+    if reason is None:
+        db = await get_cache_db()
+        async with db.execute(
+            "SELECT reason, expires_at FROM negative_cache WHERE cache_key = ? AND expires_at > ?",
+            (cache_key, int(time.time())),
+        ) as cursor:
             row = await cursor.fetchone()
-            return row if row else None
+        if not row:
+            return None
+        reason, expires_at = row
+        negative_memory_cache.set(cache_key, reason, ttl=expires_at - time.time())
+    negative_cache_stats["hits"] += 1
+    return reason
 
-async def set_youtube_cache(query, yt_title, yt_url):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("INSERT OR REPLACE INTO youtube_cache (yt_query, yt_title, yt_url) VALUES (?, ?, ?)", (query, yt_title, yt_url))
-        await db.commit()
+async def set_negative_cache(cache_key: str, reason: str):
+    if NEGATIVE_CACHE_TTL <= 0:
+        return
+    negative_memory_cache.set(cache_key, reason)
+    negative_cache_stats["stored"] += 1
+    db = await get_cache_db()
+    await db.execute(
+        "INSERT OR REPLACE INTO negative_cache (cache_key, reason, expires_at) VALUES (?, ?, ?)",
+        (cache_key, reason, int(time.time()) + NEGATIVE_CACHE_TTL),
+    )
+    await db.commit()
+
+def memory_cache_stats() -> dict:
+    caches = (spotify_memory_cache, youtube_memory_cache, recording_memory_cache)
+    return {
+        "entries": sum(len(c) for c in caches),
+        "hits": sum(c.hits for c in caches),
+        "misses": sum(c.misses for c in caches),
+        "evictions": sum(c.evictions for c in caches),
+    }
+
+# Vedlikehold av disk-cachen: skriv tilgangsstatistikk, kast de kaldeste radene og komprimer filen.
+CACHE_EVICT_BATCH = 500
+cache_maintenance_task: asyncio.Task | None = None
+
+
+async def flush_cache_touches():
+    db = await get_cache_db()
+    for table, key_column in CACHE_TABLE_KEYS.items():
+        touches = _cache_touches[table]
+        if not touches:
+            continue
+        rows = [(last_access, hits, key) for key, (last_access, hits) in touches.items()]
+        touches.clear()
+        await db.executemany(
+            f"UPDATE {table} SET last_access = MAX(last_access, ?), hit_count = hit_count + ? WHERE {key_column} = ?",
+            rows,
+        )
+    await db.commit()
+
+
+async def evict_cold_cache_rows(max_rows: int) -> int:
+    if max_rows <= 0:
+        return 0
+    db = await get_cache_db()
+    evicted = 0
+    for table in CACHE_TABLE_KEYS:
+        async with db.execute(f"SELECT COUNT(*) FROM {table}") as cursor:
+            excess = (await cursor.fetchone())[0] - max_rows
+        while excess > 0:
+            batch = min(excess, CACHE_EVICT_BATCH)
+            await db.execute(
+                f"DELETE FROM {table} WHERE rowid IN "
+                f"(SELECT rowid FROM {table} ORDER BY last_access ASC, hit_count ASC LIMIT ?)",
+                (batch,),
+            )
+            await db.commit()
+            excess -= batch
+            evicted += batch
+            # Slipp event-loopen mellom batchene så avspilling ikke merker oppryddingen.
+            await asyncio.sleep(0)
+    disk_cache_stats["evictions"] += evicted
+    return evicted
+
+
+async def cache_maintenance_loop():
+    while True:
+        await asyncio.sleep(CACHE_EVICT_INTERVAL)
+        try:
+            await flush_cache_touches()
+            evicted = await evict_cold_cache_rows(CACHE_MAX_ROWS)
+            db = await get_cache_db()
+            await db.execute("DELETE FROM negative_cache WHERE expires_at <= ?", (int(time.time()),))
+            await db.execute("PRAGMA incremental_vacuum(1000)")
+            await db.commit()
+            if evicted:
+                print(f"[Cache] Fjernet {evicted} kalde rader fra disk-cachen.")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Cache] Vedlikehold feilet: {e}")
+
+
+def start_cache_maintenance():
+    global cache_maintenance_task
+    if cache_maintenance_task is None or cache_maintenance_task.done():
+        cache_maintenance_task = asyncio.create_task(cache_maintenance_loop())
+
+
+async def shutdown_cache():
+    if cache_maintenance_task:
+        cache_maintenance_task.cancel()
+    if cache_db is not None:
+        try:
+            await flush_cache_touches()
+        except Exception as e:
+            print(f"[Cache] Kunne ikke lagre tilgangsstatistikk: {e}")
+    await close_cache_db()
+
+
+async def count_cache_rows() -> tuple[int, int, int]:
+    db = await get_cache_db()
+    async with db.execute("SELECT COUNT(*) FROM spotify_cache") as cursor:
+        spotify_count = (await cursor.fetchone())[0]
+    async with db.execute("SELECT COUNT(*) FROM youtube_cache") as cursor:
+        youtube_count = (await cursor.fetchone())[0]
+    async with db.execute("SELECT COUNT(*) FROM recording_cache") as cursor:
+        recording_count = (await cursor.fetchone())[0]
+    return spotify_count, youtube_count, recording_count
+
+
+# Asynkront Spotify-lag: spotipy er synkron, så alle kall kjøres i en egen begrenset trådpool
+# slik at event-loopen (progress-oppdateringer, andre guilds) aldri blokkeres.
+SPOTIFY_TOKEN_REFRESH_MARGIN = 300  # sekunder før utløp tokenet fornyes
+_spotify_executor = ThreadPoolExecutor(max_workers=SPOTIFY_MAX_WORKERS, thread_name_prefix="spotify")
+spotify_token_task: asyncio.Task | None = None
+
+
+def spotify_retry_after(error: spotipy.SpotifyException) -> float | None:
+    """Sekunder fra Retry-After i et Spotify-feilsvar, eller None hvis headeren mangler."""
+    retry_after = (error.headers or {}).get("Retry-After")
+    return float(retry_after) if retry_after and str(retry_after).isdigit() else None
+
+
+async def spotify_call(method, *args, **kwargs):
+    """Kjør et synkront spotipy-kall i Spotify-trådpoolen, med backoff ved rate limit (429) og 5xx."""
+    loop = asyncio.get_running_loop()
+    delay = 1.0
+    for attempt in range(SPOTIFY_MAX_RETRIES + 1):
+        try:
+            return await loop.run_in_executor(_spotify_executor, functools.partial(method, *args, **kwargs))
+        except spotipy.SpotifyException as e:
+            status = e.http_status or 0
+            if attempt >= SPOTIFY_MAX_RETRIES or not (status == 429 or status >= 500):
+                raise
+            wait = spotify_retry_after(e) or delay
+            print(f"[Spotify] HTTP {status}, prøver igjen om {wait:.0f}s.")
+            await asyncio.sleep(min(wait, 60))
+            delay = min(delay * 2, 30)
+
+
+def _refresh_spotify_token() -> float:
+    # Kjøres i trådpoolen. Fornyer tokenet hvis det utløper innen marginen og returnerer utløpstidspunktet.
+    auth = sp.auth_manager
+    token_info = auth.cache_handler.get_cached_token()
+    if not token_info or token_info["expires_at"] - time.time() < SPOTIFY_TOKEN_REFRESH_MARGIN:
+        token_info = auth.get_access_token(as_dict=True, check_cache=False)
+    return token_info["expires_at"]
+
+
+async def spotify_token_loop():
+    while True:
+        try:
+            expires_at = await asyncio.get_running_loop().run_in_executor(_spotify_executor, _refresh_spotify_token)
+            wait = expires_at - time.time() - SPOTIFY_TOKEN_REFRESH_MARGIN
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Spotify] Token-fornyelse feilet: {e}")
+            wait = 30
+        await asyncio.sleep(max(30, wait))
+
+
+def start_spotify_token_refresh():
+    global spotify_token_task
+    if sp is not None and (spotify_token_task is None or spotify_token_task.done()):
+        spotify_token_task = asyncio.create_task(spotify_token_loop())
+
+
+# Spotify-samlinger (spilleliste, album, artist) hentes side for side i de største sidene API-et tillater.
+SPOTIFY_PLAYLIST_PAGE = 100
+SPOTIFY_ALBUM_PAGE = 50
+
+
+def _playable_spotify_tracks(tracks) -> list:
+    return [t for t in tracks if t and t.get("id") and t.get("artists")]
+
+
+async def iter_spotify_collection(kind: str, collection_id: str):
+    """Gi (navn, spor) side for side for en Spotify-spilleliste, et album eller en artists toppspor."""
+    if kind == "playlist":
+        info = await spotify_call(sp.playlist, collection_id, fields="name,tracks.total")
+        name = info.get("name")
+        # Nyeste spor først, som før: bla bakover fra slutten av spillelisten.
+        offset = info["tracks"]["total"]
+        while offset > 0:
+            limit = min(SPOTIFY_PLAYLIST_PAGE, offset)
+            offset -= limit
+            page = await spotify_call(
+                sp.playlist_items,
+                collection_id,
+                offset=offset,
+                limit=limit,
+                fields="items(track(id,name,artists(name),external_ids(isrc)))",
+                additional_types=("track",),
+            )
+            yield name, _playable_spotify_tracks(item.get("track") for item in reversed(page["items"]))
+
+    elif kind == "album":
+        album = await spotify_call(sp.album, collection_id)
+        name = album.get("name")
+        page = album["tracks"]
+        offset = 0
+        while True:
+            offset += len(page["items"])
+            yield name, _playable_spotify_tracks(page["items"])
+            if not page.get("next"):
+                break
+            page = await spotify_call(sp.album_tracks, collection_id, limit=SPOTIFY_ALBUM_PAGE, offset=offset)
+
+    elif kind == "artist":
+        tracks = (await spotify_call(sp.artist_top_tracks, collection_id))["tracks"]
+        name = next(
+            (a["name"] for t in tracks for a in t.get("artists", []) if a.get("id") == collection_id),
+            None,
+        )
+        yield name, _playable_spotify_tracks(tracks)
+
+
+SPOTIFY_TRACKS_BATCH = 50  # maks ID-er per sp.tracks-kall
+
+
+def _spotify_isrc(track: dict) -> str | None:
+    return (track.get("external_ids") or {}).get("isrc")
+
+
+async def fetch_spotify_isrcs(track_ids: list) -> dict:
+    """Hent ISRC for spor som mangler det (albumspor), 50 ID-er per kall. Feil gir bare færre ISRC-er."""
+    isrcs = {}
+    try:
+        for chunk in _chunked(track_ids, SPOTIFY_TRACKS_BATCH):
+            result = await spotify_call(sp.tracks, chunk)
+            for track in result.get("tracks") or []:
+                if track and track.get("id"):
+                    isrcs[track["id"]] = _spotify_isrc(track)
+    except Exception as e:
+        print(f"[Spotify] Klarte ikke hente ISRC: {e}")
+    return isrcs
+
+
+def _source_cache_key(source: str, source_id: str) -> str:
+    # Spotify-ID-er lagres rått i spotify_cache, andre kilder med prefiks (f.eks. 'apple:<id>').
+    return source_id if source == "spotify" else f"{source}:{source_id}"
+
+
+async def pending_tracks(source: str, metas: list, requester_id: int | None, *, fetch_isrcs=None) -> list:
+    """Gjør (id, tittel, artist, isrc) om til uoppløste QueueEntry, med søk fra spotify_cache i én batch-lesing og -skriving.
+
+    fetch_isrcs(ids) brukes for nye spor uten ISRC, så de kan knyttes til samme innspilling fra andre kilder.
+    """
+    keys = [_source_cache_key(source, source_id) for source_id, _, _, _ in metas]
+    searches = await get_spotify_cache_many(keys)
+    new_metas = {key: meta for key, meta in zip(keys, metas) if key not in searches}
+    if new_metas:
+        missing_isrcs = [source_id for source_id, _, _, isrc in new_metas.values() if not isrc]
+        fetched = await fetch_isrcs(missing_isrcs) if fetch_isrcs and missing_isrcs else {}
+        new_searches = await recording_searches(
+            [(title, artist, isrc or fetched.get(source_id)) for source_id, title, artist, isrc in new_metas.values()]
+        )
+        new_searches = dict(zip(new_metas, new_searches))
+        searches.update(new_searches)
+        await set_spotify_cache_many(new_searches)
+    return [
+        QueueEntry(title, search=searches[key], requester_id=requester_id)
+        for key, (_, title, _, _) in zip(keys, metas)
+    ]
+
+
+async def pending_spotify_tracks(tracks: list, requester_id: int | None) -> list:
+    return await pending_tracks(
+        "spotify",
+        [(t["id"], t["name"], t["artists"][0]["name"], _spotify_isrc(t)) for t in tracks],
+        requester_id,
+        fetch_isrcs=fetch_spotify_isrcs,
+    )
+
+
+# Felles HTTP-klient for all utgående trafikk (iTunes, avatarer): keep-alive og begrenset samtidighet.
+http_session: aiohttp.ClientSession | None = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    global http_session
+    if http_session is None or http_session.closed:
+        http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=HTTP_MAX_CONNECTIONS, keepalive_timeout=30, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT, connect=5),
+        )
+    return http_session
+
+
+async def close_http_session():
+    global http_session
+    session, http_session = http_session, None
+    if session is not None and not session.closed:
+        await session.close()
+
+
+async def http_get_json(url: str, **params):
+    async with get_http_session().get(url, params=params or None) as resp:
+        resp.raise_for_status()
+        return await resp.json(content_type=None)
+
+
+async def http_get_bytes(url: str) -> bytes:
+    async with get_http_session().get(url) as resp:
+        resp.raise_for_status()
+        return await resp.read()
+
+
+async def http_get_text(url: str) -> str:
+    async with get_http_session().get(url) as resp:
+        resp.raise_for_status()
+        return await resp.text()
 
 
 # Apple Music helper (bruker iTunes public lookup API)
 # Gjenbruker spotify_cache ved å lagre nøkkel 'apple:<id>' -> ytsearch...
+APPLE_MUSIC_RE = re.compile(r"music\.apple\.com/(?:([a-z]{2})/)?(song|album|playlist)/(?:[^/?#]+/)?([\w.-]+)")
+APPLE_SONG_LINK_RE = re.compile(r"music\.apple\.com/[a-z]{2}/song/(?:[^/\"?#]+/)?(\d+)")
+APPLE_LOOKUP_URL = "https://itunes.apple.com/lookup"
+APPLE_LOOKUP_BATCH = 150  # ID-er per lookup-kall
+
+
+def _apple_song(res: dict) -> tuple | None:
+    if res.get("wrapperType") != "track" or not res.get("trackName"):
+        return None
+    # iTunes oppgir sjelden ISRC, men brukes når det finnes.
+    return str(res["trackId"]), res["trackName"], res.get("artistName") or "", res.get("isrc")
+
+
+async def fetch_apple_tracks(track_ids: list, country: str) -> list:
+    """Slå opp mange Apple Music-sang-ID-er med ett lookup?id=a,b,c-kall per batch. Returnerer (id, tittel, artist, isrc)."""
+    songs = {}
+    for chunk in _chunked(list(dict.fromkeys(track_ids)), APPLE_LOOKUP_BATCH):
+        data = await http_get_json(APPLE_LOOKUP_URL, id=",".join(chunk), country=country)
+        for res in (data or {}).get("results", []):
+            song = _apple_song(res)
+            if song:
+                songs[song[0]] = song
+    return [songs[track_id] for track_id in track_ids if track_id in songs]
+
 
 async def fetch_apple_track(track_id: str, country: str) -> tuple | None:
-    """Returner (title, artist) for Apple Music track id eller None hvis ikke funnet."""
-    url = f"https://itunes.apple.com/lookup?id={track_id}&country={country}"
-    try:
-        data = await asyncio.to_thread(lambda: requests.get(url, timeout=8).json())
-        if not data or data.get("resultCount", 0) == 0:
-            return None
-        res = data["results"][0]
-        title = res.get("trackName") or res.get("collectionName")
-        artist = res.get("artistName") or ""
-        if not title:
-            return None
-        return title, artist
-    except Exception as e:
-        print(f"[AppleMusic] Lookup-feil: {e}")
+    """Returner (title, artist, isrc) for Apple Music track id eller None hvis ikke funnet.
+
+    Nettverksfeil kastes videre, slik at de ikke havner i den negative cachen.
+    """
+    songs = await fetch_apple_tracks([track_id], country)
+    if not songs:
         return None
+    _, title, artist, isrc = songs[0]
+    return title, artist, isrc
+
+
+async def fetch_apple_album(album_id: str, country: str) -> tuple:
+    """Returner (albumnavn, [(id, tittel, artist, isrc)]) med ett enkelt lookup-kall."""
+    data = await http_get_json(APPLE_LOOKUP_URL, id=album_id, entity="song", limit=200, country=country)
+    results = (data or {}).get("results", [])
+    name = next((r.get("collectionName") for r in results if r.get("wrapperType") == "collection"), None)
+    songs = [song for song in map(_apple_song, results) if song]
+    return name, songs
+
+
+async def fetch_apple_playlist(url: str, country: str) -> tuple:
+    # iTunes-API-et kjenner ikke spillelister, så sang-ID-ene hentes fra den offentlige siden
+    # og slås deretter opp samlet.
+    page = await http_get_text(url)
+    track_ids = list(dict.fromkeys(APPLE_SONG_LINK_RE.findall(page)))
+    title = re.search(r'<meta property="og:title" content="([^"]*)"', page)
+    return (html.unescape(title.group(1)) if title else None), await fetch_apple_tracks(track_ids, country)
+
+def _entry_length(item) -> int:
+    # Spillelengde i ms; direktesendinger og uoppløste spor teller som 0.
+    return getattr(item, "length", 0) or 0
+
+
+class GuildQueue:
+    """Kø for én guild, lagret som en liste av deque-biter.
+
+    Begge ender er O(1), og oppslag, fjerning og flytting midt i køen berører bare én bit
+    (maks CHUNK_SIZE elementer) etter et hopp over bitlengdene. Sider hentes med vanlig slicing.
+    Hver bit har en løpende sum av spillelengdene, så total- og ventetid aldri krever en full gjennomgang.
+    """
+
+    CHUNK_SIZE = 256
+    __slots__ = ("_chunks", "_sums", "_len", "duration", "unresolved", "guild_id")
+
+    def __init__(self, items=(), *, guild_id: int | None = None):
+        self._chunks: list[deque] = []
+        self._sums: list[int] = []  # ms per bit, parallelt med _chunks
+        self._len = 0
+        self.duration = 0  # ms totalt i køen
+        self.unresolved = 0  # spor som ikke er slått opp ennå; de teller som 0 ms i duration
+        self.guild_id = guild_id  # satt = endringer lagres som deltaer i queue_store
+        self.extend(items)
+
+    def _add_length(self, chunk_index: int, length_ms: int):
+        self._sums[chunk_index] += length_ms
+        self.duration += length_ms
+
+    def _count(self, chunk_index: int, item, sign: int):
+        self._add_length(chunk_index, sign * _entry_length(item))
+        if getattr(item, "encoded", "") is None:
+            self.unresolved += sign
+
+    def duration_before(self, index: int) -> int:
+        """Samlet lengde (ms) av elementene før posisjon index, dvs. ventetiden fra toppen av køen."""
+        index = min(max(index, 0), self._len)
+        total = 0
+        for chunk, chunk_sum in zip(self._chunks, self._sums):
+            if index < len(chunk):
+                return total + sum(_entry_length(item) for item in islice(chunk, index))
+            total += chunk_sum
+            index -= len(chunk)
+        return total
+
+    def length_changed(self, item, old_length_ms: int):
+        # Et element som løses opp får kjent lengde; de ligger nesten alltid i første bit.
+        # Kalles bare når et uoppløst element nettopp er fylt ut.
+        for chunk_index, chunk in enumerate(self._chunks):
+            if any(entry is item for entry in chunk):
+                self._add_length(chunk_index, _entry_length(item) - old_length_ms)
+                self.unresolved -= 1
+                return
+
+    def _stored(self, item, seq: float):
+        item.seq = seq
+        queue_store.put(self.guild_id, item)
+
+    def _dropped(self, item):
+        if self.guild_id is not None and item.seq is not None:
+            queue_store.delete(self.guild_id, item.seq)
+            item.seq = None
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return chain.from_iterable(self._chunks)
+
+    def _locate(self, index: int) -> tuple[int, int]:
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("køindeks utenfor rekkevidde")
+        for chunk_index, chunk in enumerate(self._chunks):
+            if index < len(chunk):
+                return chunk_index, index
+            index -= len(chunk)
+        raise IndexError("køindeks utenfor rekkevidde")
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1 or start >= stop:
+                return list(self)[index]
+            chunk_index, offset = self._locate(start)
+            items = chain(islice(self._chunks[chunk_index], offset, None), *self._chunks[chunk_index + 1:])
+            return list(islice(items, stop - start))
+        chunk_index, offset = self._locate(index)
+        return self._chunks[chunk_index][offset]
+
+    def append(self, item):
+        if self.guild_id is not None:
+            self._stored(item, self._chunks[-1][-1].seq + 1 if self._len else 0)
+        if not self._chunks or len(self._chunks[-1]) >= self.CHUNK_SIZE:
+            self._chunks.append(deque())
+            self._sums.append(0)
+        self._chunks[-1].append(item)
+        self._count(-1, item, 1)
+        self._len += 1
+
+    def appendleft(self, item):
+        if self.guild_id is not None:
+            self._stored(item, self._chunks[0][0].seq - 1 if self._len else 0)
+        if not self._chunks or len(self._chunks[0]) >= self.CHUNK_SIZE:
+            self._chunks.insert(0, deque())
+            self._sums.insert(0, 0)
+        self._chunks[0].appendleft(item)
+        self._count(0, item, 1)
+        self._len += 1
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def popleft(self):
+        if not self._len:
+            raise IndexError("pop fra tom kø")
+        chunk = self._chunks[0]
+        item = chunk.popleft()
+        self._count(0, item, -1)
+        if not chunk:
+            del self._chunks[0]
+            del self._sums[0]
+        self._len -= 1
+        self._dropped(item)
+        return item
+
+    def pop(self, index: int = -1):
+        chunk_index, offset = self._locate(index)
+        chunk = self._chunks[chunk_index]
+        item = chunk[offset]
+        del chunk[offset]
+        self._count(chunk_index, item, -1)
+        if not chunk:
+            del self._chunks[chunk_index]
+            del self._sums[chunk_index]
+        self._len -= 1
+        self._dropped(item)
+        return item
+
+    def insert(self, index: int, item):
+        if index < 0:
+            index = max(0, index + self._len)
+        if index == 0:
+            return self.appendleft(item)
+        if index >= self._len:
+            return self.append(item)
+        if self.guild_id is not None:
+            # seq midt mellom naboene holder rekkefølgen på disk uten å nummerere om resten.
+            self._stored(item, (self[index - 1].seq + self[index].seq) / 2)
+        chunk_index, offset = self._locate(index)
+        chunk = self._chunks[chunk_index]
+        chunk.insert(offset, item)
+        self._count(chunk_index, item, 1)
+        self._len += 1
+        if len(chunk) > 2 * self.CHUNK_SIZE:
+            # Del biten i to så innsetting midt i køen aldri blir dyrere enn én bit.
+            tail = deque(islice(chunk, self.CHUNK_SIZE, None))
+            for _ in range(len(tail)):
+                chunk.pop()
+            tail_sum = sum(map(_entry_length, tail))
+            self._chunks.insert(chunk_index + 1, tail)
+            self._sums.insert(chunk_index + 1, tail_sum)
+            self._sums[chunk_index] -= tail_sum
+
+    def move(self, source: int, target: int):
+        """Flytt elementet på posisjon source til posisjon target (0 = først) og returner det."""
+        item = self.pop(source)
+        self.insert(target, item)
+        return item
+
+    def index(self, item) -> int:
+        # Sammenligner identitet: to køelementer for samme sang er likevel forskjellige oppføringer.
+        for position, entry in enumerate(self):
+            if entry is item:
+                return position
+        raise ValueError("elementet finnes ikke i køen")
+
+    def clear(self):
+        if self.guild_id is not None:
+            queue_store.clear(self.guild_id)
+            for item in self:
+                item.seq = None
+        self._chunks.clear()
+        self._sums.clear()
+        self._len = 0
+        self.duration = 0
+        self.unresolved = 0
+
+    def restore(self, items):
+        """Fyll køen med elementer som allerede er lagret (med seq), uten å skrive dem på nytt."""
+        guild_id, self.guild_id = self.guild_id, None
+        try:
+            self.extend(items)
+        finally:
+            self.guild_id = guild_id
+
+    def shuffle(self):
+        items = list(self)
+        random.shuffle(items)
+        self.clear()
+        self.extend(items)
+
 
 # Guild state (multi-server support)
 # Hver server får sin egen kø slik at flere kan spille samtidig uten å påvirke hverandre.
-music_queues = {}          # guild.id -> list[pomice.Track]
+music_queues = {}          # guild.id -> GuildQueue[QueueEntry]
 embed_messages = {}        # guild.id -> discord.Message (now playing)
 track_data = {}            # guild.id -> (track, ctx)
-update_tasks = {}          # guild.id -> asyncio.Task (progress updater)
 pause_start_times = {}     # guild.id -> pause start timestamp
+advancing_guilds = set()   # guild.id der play_next henter neste spor (spilleren står stille imens)
 
 
 def is_playing(vc):
     return bool(vc and getattr(vc, "is_playing", False) and getattr(vc, "current", None) is not None)
 
 
-def get_guild_queue(guild_id: int):
+def get_guild_queue(guild_id: int) -> GuildQueue:
     # Returner (og opprett ved behov) kø for en guild.
-    return music_queues.setdefault(guild_id, [])
+    guild_queue = music_queues.get(guild_id)
+    if guild_queue is None:
+        guild_queue = music_queues[guild_id] = GuildQueue(guild_id=guild_id)
+    return guild_queue
+
+
+class QueueEntry:
+    """Kompakt køelement. Full pomice.Track bygges først når sporet skal spilles.
+
+    Spor som ikke er slått opp ennå (f.eks. fra en stor Spotify-spilleliste) har encoded=None
+    og et search som løses opp når de nærmer seg toppen av køen. length=None betyr direktesending.
+    """
+
+    __slots__ = ("encoded", "title", "length", "identifier", "uri", "requester_id", "search", "future", "seq")
+
+    def __init__(self, title: str, *, encoded: str | None = None, length: int | None = 0, identifier: str = "",
+                 uri: str = "", requester_id: int | None = None, search: str | None = None):
+        self.encoded = encoded
+        self.title = title
+        self.length = length
+        self.identifier = identifier
+        self.uri = uri
+        self.requester_id = requester_id
+        self.search = search
+        self.future: asyncio.Future | None = None  # settes når oppslaget er startet
+        self.seq: float | None = None  # rekkefølgenøkkel i queue_entries mens elementet ligger i en guild-kø
+
+    def row(self) -> tuple:
+        return (self.encoded, self.title, self.length, self.identifier, self.uri, self.requester_id, self.search)
+
+    @classmethod
+    def from_row(cls, row) -> "QueueEntry":
+        encoded, title, length, identifier, uri, requester_id, search = row
+        return cls(title, encoded=encoded, length=length, identifier=identifier or "", uri=uri or "",
+                   requester_id=requester_id, search=search)
+
+    @classmethod
+    def from_track(cls, track: pomice.Track, requester_id: int | None = None) -> "QueueEntry":
+        entry = cls(track.title, requester_id=requester_id)
+        entry.fill(track)
+        return entry
+
+    def fill(self, track: pomice.Track):
+        self.encoded = track.track_id
+        self.title = track.title
+        self.length = None if track.is_stream else int(track.length or 0)
+        self.identifier = track.identifier or ""
+        self.uri = track.uri or ""
+
+    def to_track(self, ctx) -> pomice.Track:
+        info = {
+            "title": self.title,
+            "author": "",
+            "uri": self.uri,
+            "identifier": self.identifier,
+            "length": self.length or 0,
+            "isStream": self.length is None,
+            "isSeekable": self.length is not None,
+            "position": 0,
+            "sourceName": "youtube",
+        }
+        track = pomice.Track(track_id=self.encoded, info=info, ctx=ctx, track_type=pomice.TrackType.YOUTUBE)
+        requester = ctx.guild.get_member(self.requester_id) if self.requester_id else None
+        track.requester = requester or ctx.author
+        return track
+
+
+def _start_resolving(entries: list, ctx):
+    loop = asyncio.get_running_loop()
+    for entry in entries:
+        entry.future = loop.create_future()
+    asyncio.create_task(_resolve_pending_tracks(entries, ctx))
+
+
+async def _resolve_pending_tracks(entries: list, ctx):
+    try:
+        index = 0
+        async for track in iter_youtube_searches([entry.search for entry in entries], ctx=ctx):
+            entry = entries[index]
+            index += 1
+            if track is not None:
+                old_length = _entry_length(entry)
+                entry.fill(track)
+                if entry.seq is not None:
+                    get_guild_queue(ctx.guild.id).length_changed(entry, old_length)
+                    queue_store.put(ctx.guild.id, entry)
+            if not entry.future.done():
+                entry.future.set_result(track is not None)
+    except Exception as e:
+        print(f"[Kø] Forhåndsoppslag feilet: {e}")
+    finally:
+        for entry in entries:
+            if not entry.future.done():
+                entry.future.set_result(False)
+
+
+def prefetch_queue(guild_id: int, ctx):
+    # Slå opp de neste PREFETCH_AHEAD uoppløste elementene i bakgrunnen før play_next trenger dem.
+    window = [
+        entry for entry in islice(get_guild_queue(guild_id), PREFETCH_AHEAD)
+        if entry.encoded is None and entry.future is None
+    ]
+    if window:
+        _start_resolving(window, ctx)
+
+
+async def resolve_queue_entry(entry, ctx):
+    # Returner en spillbar Track for et køelement, eller None hvis det ikke lot seg slå opp.
+    if entry.encoded is None:
+        if entry.future is None:
+            _start_resolving([entry], ctx)
+        if not await asyncio.shield(entry.future):
+            return None
+    return entry.to_track(ctx)
+
+
+# Køpersistens: endringer samles som deltaer (ny rad / slettet rad) og skrives samlet i bakgrunnen,
+# så en kø på tusenvis av spor aldri skrives om i sin helhet når ett element legges til eller spilles.
+QUEUE_FLUSH_DELAY = 1.0  # sekunder endringer samles før de skrives
+QUEUE_STORE_SQL = {
+    "put": "INSERT OR REPLACE INTO queue_entries "
+           "(guild_id, seq, encoded, title, length, identifier, uri, requester_id, search) "
+           "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    "delete": "DELETE FROM queue_entries WHERE guild_id = ? AND seq = ?",
+    "clear": "DELETE FROM queue_entries WHERE guild_id = ?",
+    "now": "INSERT OR REPLACE INTO now_playing "
+           "(guild_id, voice_channel_id, text_channel_id, encoded, title, length, identifier, uri, requester_id, "
+           "position, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?)",
+    "now_clear": "DELETE FROM now_playing WHERE guild_id = ?",
+}
+
+
+class QueueStore:
+    def __init__(self):
+        self._ops: list[tuple[str, tuple]] = []
+        self._positions: dict[int, int] = {}
+        self._position_saved: dict[int, float] = {}
+        self._flush_task: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+
+    def _add(self, kind: str, params: tuple):
+        self._ops.append((kind, params))
+        self._schedule()
+
+    def _schedule(self):
+        if self._flush_task is None or self._flush_task.done():
+            try:
+                self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+            except RuntimeError:
+                pass  # ingen event-loop (f.eks. under oppstart); skrives ved neste flush
+
+    async def _flush_later(self):
+        # Endringer som kommer mens en flush pågår, skrives i en ny runde av samme oppgave.
+        while True:
+            await asyncio.sleep(QUEUE_FLUSH_DELAY)
+            try:
+                # shield: en avbrutt oppgave (close) skal ikke miste en batch som allerede er tatt ut.
+                await asyncio.shield(self.flush())
+            except Exception as e:
+                print(f"[Kø] Klarte ikke lagre køen: {e}")
+            if not self._ops and not self._positions:
+                return
+
+    def put(self, guild_id: int, entry: QueueEntry):
+        self._add("put", (guild_id, entry.seq, *entry.row()))
+
+    def delete(self, guild_id: int, seq: float):
+        self._add("delete", (guild_id, seq))
+
+    def clear(self, guild_id: int):
+        self._add("clear", (guild_id,))
+
+    def set_now_playing(self, guild_id: int, voice_channel_id: int, text_channel_id: int, entry: QueueEntry):
+        self._positions.pop(guild_id, None)
+        self._add("now", (guild_id, voice_channel_id, text_channel_id, *entry.row()[:6], int(time.time())))
+
+    def clear_now_playing(self, guild_id: int):
+        self._positions.pop(guild_id, None)
+        self._add("now_clear", (guild_id,))
+
+    def save_position(self, guild_id: int, position_ms: int):
+        # Posisjonen endres hele tiden; den skrives høyst hvert QUEUE_POSITION_INTERVAL sekund.
+        self._positions[guild_id] = int(position_ms)
+        if time.monotonic() - self._position_saved.get(guild_id, 0) >= QUEUE_POSITION_INTERVAL:
+            self._position_saved[guild_id] = time.monotonic()
+            self._schedule()
+
+    async def flush(self):
+        async with self._flush_lock:
+            await self._write()
+
+    async def _write(self):
+        ops, self._ops = self._ops, []
+        positions, self._positions = self._positions, {}
+        if not ops and not positions:
+            return
+        db = await get_cache_db()
+        # Påfølgende endringer av samme type skrives med én executemany.
+        start = 0
+        while start < len(ops):
+            kind = ops[start][0]
+            end = start
+            while end < len(ops) and ops[end][0] == kind:
+                end += 1
+            await db.executemany(QUEUE_STORE_SQL[kind], [params for _, params in ops[start:end]])
+            start = end
+        if positions:
+            now = int(time.time())
+            await db.executemany(
+                "UPDATE now_playing SET position = ?, updated_at = ? WHERE guild_id = ?",
+                [(position, now, guild_id) for guild_id, position in positions.items()],
+            )
+        await db.commit()
+
+    async def load(self) -> dict:
+        """Returner {guild_id: (now_playing-rad eller None, [QueueEntry])} for alle lagrede køer."""
+        db = await get_cache_db()
+        state = {}
+        async with db.execute(
+            "SELECT guild_id, voice_channel_id, text_channel_id, encoded, title, length, identifier, uri, "
+            "requester_id, position FROM now_playing"
+        ) as cursor:
+            for guild_id, *row in await cursor.fetchall():
+                state[guild_id] = (row, [])
+        async with db.execute(
+            "SELECT guild_id, seq, encoded, title, length, identifier, uri, requester_id, search "
+            "FROM queue_entries ORDER BY guild_id, seq"
+        ) as cursor:
+            for guild_id, seq, *row in await cursor.fetchall():
+                entry = QueueEntry.from_row(row)
+                entry.seq = seq
+                state.setdefault(guild_id, (None, []))[1].append(entry)
+        return state
+
+    async def close(self):
+        # Avbryt ventingen, ikke skrivingen: flush() tar låsen og venter på en pågående batch først.
+        if self._flush_task:
+            self._flush_task.cancel()
+        await self.flush()
+
+
+queue_store = QueueStore()
+
+
+class _RestoredMessage:
+    async def delete(self, *, delay=None):
+        pass
+
+
+class RestoredContext:
+    """Minimal erstatning for commands.Context når avspilling gjenopptas uten en kommando (etter omstart)."""
+
+    def __init__(self, guild: discord.Guild, channel, author):
+        self.guild = guild
+        self.channel = channel
+        self.author = author
+        self.message = _RestoredMessage()
+        self.command = None
+
+    async def send(self, *args, **kwargs):
+        return await self.channel.send(*args, **kwargs)
+
+
+async def resume_playback(ctx, voice_channel, current: QueueEntry, position: int, entries: list, *, stored=False):
+    """Koble til voice, legg entries i køen og spill current fra position (ms). Brukes av !reset og oppstart."""
+    guild_queue = get_guild_queue(ctx.guild.id)
+    if stored:
+        guild_queue.restore(entries)
+    else:
+        guild_queue.extend(entries)
+    vc = resolve_player(ctx.guild)
+    if not vc or not getattr(vc, "channel", None):
+        vc = await voice_channel.connect(
+            cls=OnalPlayer,
+            self_deaf=True,
+            reconnect=True,
+            timeout=VOICE_CONNECT_TIMEOUT,
+        )
+    vc.ctx = ctx
+    track = current.to_track(ctx)
+    await vc.play(track, start=max(0, position) if current.length else 0)
+    try:
+        await vc.set_volume(DEFAULT_VOLUME)
+    except Exception:
+        pass
+    await show_now_playing(track, ctx)
+    prefetch_queue(ctx.guild.id, ctx)
+
+
+async def restore_saved_queues():
+    """Gjenoppta lagrede køer etter omstart: sporene bygges lokalt fra lagret base64, uten nye søk."""
+    state = await queue_store.load()
+    restored = 0
+    for guild_id, (now_row, entries) in state.items():
+        guild = bot.get_guild(guild_id)
+        voice_channel = text_channel = None
+        if guild and now_row:
+            voice_channel = guild.get_channel(now_row[0])
+            text_channel = guild.get_channel(now_row[1])
+        listeners = [m for m in getattr(voice_channel, "members", []) if not m.bot]
+        if not (voice_channel and text_channel and listeners):
+            # Ingen å spille for (eller kanalen finnes ikke lenger): forkast den lagrede køen.
+            queue_store.clear(guild_id)
+            queue_store.clear_now_playing(guild_id)
+            continue
+        _, _, *track_row, position = now_row
+        current = QueueEntry.from_row((*track_row, None))
+        author = guild.get_member(current.requester_id) or guild.me
+        try:
+            await resume_playback(RestoredContext(guild, text_channel, author), voice_channel, current, position, entries, stored=True)
+            restored += 1
+        except Exception as e:
+            print(f"[Kø] Klarte ikke gjenoppta avspilling i {guild.name}: {e}")
+            get_guild_queue(guild_id).clear()
+            queue_store.clear_now_playing(guild_id)
+    if restored:
+        print(f"[Kø] Gjenopptok avspilling i {restored} server(e).")
 
 
 async def _auto_delete_message(msg: discord.Message, delay: float):
@@ -290,7 +2094,7 @@ async def stop_and_clear(ctx, *, notify=None, disconnect=True, delete_after=15):
             pass
         if disconnect:
             try:
-                await vc.destroy()
+                await vc.destroy(force=True)
             except Exception:
                 pass
 
@@ -301,9 +2105,10 @@ async def stop_and_clear(ctx, *, notify=None, disconnect=True, delete_after=15):
             pass
 
     get_guild_queue(guild_id).clear()
+    queue_store.clear_now_playing(guild_id)
     pause_start_times.pop(guild_id, None)
     track_data.pop(guild_id, None)
-    await bot.change_presence(activity=None)
+    presence.clear(guild_id)
 
     embed_msg = embed_messages.pop(guild_id, None)
     if embed_msg:
@@ -312,10 +2117,7 @@ async def stop_and_clear(ctx, *, notify=None, disconnect=True, delete_after=15):
         except discord.NotFound:
             pass
 
-    current_task = asyncio.current_task()
-    task = update_tasks.pop(guild_id, None)
-    if task and task is not current_task:
-        task.cancel()
+    progress_scheduler.unwatch(guild_id)
 
     if notify:
         message = await ctx.send(notify)
@@ -323,6 +2125,30 @@ async def stop_and_clear(ctx, *, notify=None, disconnect=True, delete_after=15):
             asyncio.create_task(_auto_delete_message(message, delete_after))
 
 
+def format_duration(ms: int) -> str:
+    seconds = int(ms // 1000)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+def current_remaining_ms(guild_id: int) -> int:
+    # Gjenstående tid (ms) av sporet som spilles nå; 0 for direktesendinger.
+    current = track_data.get(guild_id)
+    if not current:
+        return 0
+    song, ctx = current
+    if getattr(song, "is_stream", False):
+        return 0
+    vc = resolve_player(ctx.guild)
+    return max(0, (getattr(song, "length", 0) or 0) - int(getattr(vc, "position", 0) or 0))
+
+
+def queue_eta_ms(guild_id: int, index: int) -> int:
+    """Omtrent hvor lenge (ms) til køelementet på posisjon index starter."""
+    return current_remaining_ms(guild_id) + get_guild_queue(guild_id).duration_before(index)
+
+
 def _queue_page_count(total_items: int, page_size: int) -> int:
     return max(1, math.ceil(total_items / page_size))
 
@@ -495,12 +2321,37 @@ class QueueCloseButton(discord.ui.Button):
         await interaction.response.edit_message(content="Fjerningslisten ble lukket.", embed=None, view=None)
 
 
-def _queue_display_embed(guild_queue: list, page: int, page_size: int, total_pages: int) -> discord.Embed:
+EMBED_DESCRIPTION_LIMIT = 4096
+
+
+def queue_lines(items, start: int = 0) -> str:
+    """Nummererte titler fra items, bare så mange hele linjer som får plass i en embed."""
+    lines = []
+    size = -1
+    # Hver linje er minst fire tegn, så islice stopper lenge før en kø på 100k spor er gått gjennom.
+    for number, track in enumerate(islice(items, EMBED_DESCRIPTION_LIMIT // 4), start + 1):
+        line = f"{number}. {track.title}"
+        size += len(line) + 1
+        if size > EMBED_DESCRIPTION_LIMIT:
+            break
+        lines.append(line)
+    return "\n".join(lines)[:EMBED_DESCRIPTION_LIMIT]
+
+
+def queue_duration_text(guild_queue: GuildQueue) -> str:
+    # Spor som ikke er slått opp ennå har ukjent lengde, så tiden er da en nedre grense.
+    if guild_queue.unresolved:
+        return f"minst {format_duration(guild_queue.duration)} igjen · {guild_queue.unresolved} uten kjent lengde"
+    return f"{format_duration(guild_queue.duration)} igjen"
+
+
+def _queue_display_embed(guild_queue: GuildQueue, page: int, page_size: int, total_pages: int) -> discord.Embed:
     start = page * page_size
-    lines = [f"{start + i + 1}. {track.title}" for i, track in enumerate(guild_queue[start:start + page_size])]
-    description = "\n".join(lines)[:4096]
+    description = queue_lines(guild_queue[start:start + page_size], start)
     embed = discord.Embed(title="🎶 Musikk-kø", description=description, color=discord.Color.blue())
-    embed.set_footer(text=f"Side {page + 1}/{total_pages} · {len(guild_queue)} sanger totalt")
+    embed.set_footer(
+        text=f"Side {page + 1}/{total_pages} · {len(guild_queue)} sanger totalt · {queue_duration_text(guild_queue)}"
+    )
     return embed
 
 
@@ -554,6 +2405,7 @@ class SongView(discord.ui.View):
             await vc.set_pause(True)
             pause_start_times[guild_id] = time.time()
             await self.ctx.send("**Player paused**", delete_after=2)
+        progress_scheduler.poke(guild_id)
 
     @discord.ui.button(emoji='\u23F9')
     async def stop_button(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -567,9 +2419,7 @@ class SongView(discord.ui.View):
         if not vc or not is_playing(vc):
             return await self.ctx.send(":x: **No music is playing at the moment.**", delete_after=5)
         vc.ctx = self.ctx
-        if vc.guild.id in update_tasks:
-            update_tasks[vc.guild.id].cancel()
-            update_tasks.pop(vc.guild.id, None)
+        progress_scheduler.unwatch(vc.guild.id)
         await vc.stop()
         await play_next(self.ctx)
 
@@ -605,12 +2455,59 @@ class SongView(discord.ui.View):
         )
 
 
-async def show_now_playing(song, ctx):
-    guild_id = ctx.guild.id
-    track_data[guild_id] = (song, ctx)
-    pause_start_times.pop(guild_id, None)
-    duration = song.length // 1000 if hasattr(song, 'length') else 0
+# Presence er global for hele botten. Endringer fra alle guilds samles i et debounce-vindu,
+# vises som en samlet tekst når flere guilds spiller, og sendes bare når teksten faktisk endres.
+PRESENCE_DEBOUNCE = 5.0  # sekunder
+
+
+class PresenceManager:
+    def __init__(self):
+        self._playing: dict[int, str] = {}  # guild.id -> tittel
+        self._sent: str | None = None
+        self._task: asyncio.Task | None = None
+        self.updates_sent = 0
+
+    def set_playing(self, guild_id: int, title: str):
+        self._playing[guild_id] = title
+        self._schedule()
+
+    def clear(self, guild_id: int):
+        self._playing.pop(guild_id, None)
+        self._schedule()
+
+    def _text(self) -> str | None:
+        if not self._playing:
+            return None
+        if len(self._playing) == 1:
+            return f"🎵 {next(iter(self._playing.values()))}"[:128]
+        return f"🎵 spiller i {len(self._playing)} servere"
+
+    def _schedule(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Endringer som kommer mens change_presence venter (f.eks. på rate limit), sendes i neste runde.
+        while True:
+            await asyncio.sleep(PRESENCE_DEBOUNCE)
+            text = self._text()
+            if text == self._sent:
+                return
+            try:
+                await bot.change_presence(activity=discord.Game(name=text) if text else None)
+            except Exception as e:
+                print(f"[Presence] Klarte ikke oppdatere status: {e}")
+                return
+            self._sent = text
+            self.updates_sent += 1
 
+
+presence = PresenceManager()
+
+
+def now_playing_embed(song, ctx, elapsed: int = 0, *, paused: bool = False, started_at: int | None = None) -> discord.Embed:
+    # Bygger now playing-embeden; brukes både ved start av et spor og av progress_scheduler.
+    duration = song.length // 1000 if hasattr(song, 'length') else 0
     title = getattr(song, 'title', 'Ukjent sang')
     uri = getattr(song, 'uri', None)
 
@@ -627,14 +2524,31 @@ async def show_now_playing(song, ctx):
 
     song_embed.set_author(name="Now Playing", icon_url="https://cdn3.emoji.gg/emojis/3468-skype-music.gif")
     guild_queue = get_guild_queue(ctx.guild.id)
-    requester = getattr(song, 'requester', ctx.author)
+    requester = getattr(song, 'requester', None) or ctx.author
     song_embed.add_field(name="Requested by", value=requester.name, inline=True)
     song_embed.add_field(name="Songs in queue", value=f"{len(guild_queue)}", inline=True)
 
     is_stream = getattr(song, 'is_stream', False)
-    progress_bar = generate_progress_bar(0, duration, is_stream=is_stream)
+    if PROGRESS_MODE == "timestamp":
+        started_at = started_at if started_at is not None else int(time.time()) - elapsed
+        progress_bar = generate_progress_timestamps(elapsed, duration, started_at, paused=paused, is_stream=is_stream)
+    else:
+        progress_bar = generate_progress_bar(elapsed, duration, is_stream=is_stream)
     song_embed.add_field(name="Progress", value=progress_bar, inline=False)
+    return song_embed
+
 
+async def show_now_playing(song, ctx):
+    guild_id = ctx.guild.id
+    track_data[guild_id] = (song, ctx)
+    pause_start_times.pop(guild_id, None)
+    vc = resolve_player(ctx.guild)
+    if vc and getattr(vc, "channel", None) and song.track_id:
+        requester_id = getattr(getattr(song, "requester", None), "id", None)
+        queue_store.set_now_playing(guild_id, vc.channel.id, ctx.channel.id, QueueEntry.from_track(song, requester_id))
+
+    started_at = int(time.time())
+    song_embed = now_playing_embed(song, ctx, started_at=started_at)
     view = SongView(song, ctx)
 
     try:
@@ -647,12 +2561,8 @@ async def show_now_playing(song, ctx):
     else:
         embed_messages[guild_id] = await ctx.send(embed=song_embed, view=view)
 
-    if guild_id in update_tasks:
-        update_tasks[guild_id].cancel()
-
-    embed_id = embed_messages[guild_id].id
-    update_tasks[guild_id] = asyncio.create_task(update_progress_loop(guild_id, song, embed_id))
-    await bot.change_presence(activity=discord.Game(name=f"🎵 {title}"))
+    progress_scheduler.watch(guild_id, song, embed_messages[guild_id].id, song_embed, started_at)
+    presence.set_playing(guild_id, getattr(song, 'title', 'Ukjent sang'))
 
 
 def generate_progress_bar(current, total, length=22, is_stream=False):
@@ -669,26 +2579,142 @@ def generate_progress_bar(current, total, length=22, is_stream=False):
     return f"`[{bar}]` {current_min}:{current_sec:02d} / {total_min}:{total_sec:02d}"
 
 
-async def update_progress_loop(guild_id, original_song, embed_id):
-    while True:
-        await asyncio.sleep(2)
+def generate_progress_timestamps(elapsed, total, started_at, *, paused=False, is_stream=False):
+    # Discord viser <t:…:R> som "for 2 minutter siden"/"om 3 minutter" og teller selv, så meldingen
+    # trenger bare redigeres når tilstanden endres (pause, fortsett, nytt spor, kølengde).
+    if is_stream:
+        return f"🔴 LIVE · startet <t:{started_at}:R>"
+    if paused:
+        return f"⏸️ Pauset ved {format_duration(elapsed * 1000)} / {format_duration(total * 1000)}"
+    if total == 0:
+        return f"Startet <t:{started_at}:R>"
+    return f"Startet <t:{started_at}:R> · slutter <t:{started_at + total}:R>"
+
+
+# Én felles planlegger oppdaterer alle now playing-meldinger, i stedet for en egen løkke per guild.
+# Intervallet følger hvor fort progress-linjen faktisk flytter seg, pauset spiller sjekkes sjelden,
+# hver tekstkanal har sin egen token-bøtte, og uendret innhold redigeres aldri.
+PROGRESS_MIN_INTERVAL = 3.0      # sekunder mellom oppdateringer mens noe spilles
+PROGRESS_MAX_INTERVAL = 15.0
+PROGRESS_PAUSED_INTERVAL = 30.0  # pauset: bare sjekk for PAUSE_DISCONNECT_TIMEOUT
+CHANNEL_EDIT_BURST = 4           # redigeringer en kanal kan ta i ett jafs
+CHANNEL_EDIT_RATE = 0.5          # nye redigeringer per sekund per kanal
+
+
+PROGRESS_TIMESTAMP_DRIFT = 5     # sekunder avvik før tidsstemplene regnes ut på nytt
+
+
+class _ProgressWatch:
+    __slots__ = ("song", "embed_id", "last_render", "token", "started_at", "paused")
+
+    def __init__(self, song, embed_id: int, last_render: dict, started_at: int):
+        self.song = song
+        self.embed_id = embed_id
+        self.last_render = last_render
+        self.token = 0  # bare heap-oppføringen med gjeldende token er gyldig
+        self.started_at = started_at  # PROGRESS_MODE=timestamp: når sporet (regnet) startet
+        self.paused = False
+
+
+class ProgressScheduler:
+    def __init__(self):
+        self._heap: list[tuple[float, int, int]] = []  # (forfallstid, token, guild_id)
+        self._watches: dict[int, _ProgressWatch] = {}
+        self._buckets: dict[int, tuple[float, float]] = {}  # kanal-id -> (tokens, sist fylt)
+        self._tokens = 0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._ticks: set[asyncio.Task] = set()
+        self.edits_sent = 0
+        self.edits_skipped = 0
+
+    def watch(self, guild_id: int, song, embed_id: int, embed: discord.Embed, started_at: int):
+        self._watches[guild_id] = _ProgressWatch(song, embed_id, embed.to_dict(), started_at)
+        self._schedule(guild_id, PROGRESS_MIN_INTERVAL)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def unwatch(self, guild_id: int):
+        # Heap-oppføringen blir liggende og forkastes når den forfaller.
+        self._watches.pop(guild_id, None)
+
+    def poke(self, guild_id: int):
+        """Oppdater meldingen snarest, f.eks. etter pause/fortsett."""
+        if guild_id in self._watches:
+            self._schedule(guild_id, 0)
+
+    def _schedule(self, guild_id: int, delay: float):
+        self._tokens += 1
+        self._watches[guild_id].token = self._tokens
+        heapq.heappush(self._heap, (time.monotonic() + delay, self._tokens, guild_id))
+        self._wakeup.set()
+
+    def _take_edit(self, channel_id: int) -> float:
+        # Token-bøtte per kanal. Returnerer 0 hvis redigering er lov nå, ellers sekunder til neste token.
+        now = time.monotonic()
+        tokens, filled = self._buckets.get(channel_id, (CHANNEL_EDIT_BURST, now))
+        tokens = min(CHANNEL_EDIT_BURST, tokens + (now - filled) * CHANNEL_EDIT_RATE)
+        if tokens < 1:
+            self._buckets[channel_id] = (tokens, now)
+            return (1 - tokens) / CHANNEL_EDIT_RATE
+        self._buckets[channel_id] = (tokens - 1, now)
+        return 0
+
+    async def _run(self):
+        while self._watches:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            due, token, guild_id = self._heap[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            watch = self._watches.get(guild_id)
+            if watch is None or watch.token != token:
+                continue
+            task = asyncio.create_task(self._run_tick(guild_id, watch))
+            self._ticks.add(task)
+            task.add_done_callback(self._ticks.discard)
+        self._heap.clear()  # bare utdaterte oppføringer igjen
+
+    async def _run_tick(self, guild_id: int, watch: _ProgressWatch):
+        try:
+            delay = await self._tick(guild_id, watch)
+        except Exception as e:
+            print(f"[Progress] Oppdatering feilet: {e}")
+            delay = PROGRESS_MAX_INTERVAL
+        if self._watches.get(guild_id) is not watch:
+            return
+        if delay is None:
+            self.unwatch(guild_id)
+        else:
+            self._schedule(guild_id, delay)
 
+    async def _tick(self, guild_id: int, watch: _ProgressWatch) -> float | None:
+        """Én oppdatering. Returnerer sekunder til neste, eller None når meldingen ikke skal følges lenger."""
         if guild_id not in track_data:
-            break
+            return None
 
         current_song, ctx = track_data[guild_id]
-        if current_song != original_song:
-            break
+        if current_song != watch.song:
+            return None
 
         embed_msg = embed_messages.get(guild_id)
-        if not embed_msg or embed_msg.id != embed_id:
-            break
+        if not embed_msg or embed_msg.id != watch.embed_id:
+            return None
 
         vc = resolve_player(ctx.guild)
         if not vc:
-            break
+            return None
 
-        if getattr(vc, "is_paused", False):
+        paused = getattr(vc, "is_paused", False)
+        if paused:
             start = pause_start_times.setdefault(guild_id, time.time())
             if time.time() - start >= PAUSE_DISCONNECT_TIMEOUT:
                 if PAUSE_DISCONNECT_TIMEOUT >= 60 and PAUSE_DISCONNECT_TIMEOUT % 60 == 0:
@@ -701,43 +2727,60 @@ async def update_progress_loop(guild_id, original_song, embed_id):
                     ctx,
                     notify=f"⏹️ Spiller stoppet etter {timeout_text} pause.",
                 )
-                break
+                return None
         else:
             pause_start_times.pop(guild_id, None)
 
         # Bruk posisjon direkte fra spilleren, håndterer pause og alt
         elapsed = int(vc.position / 1000) if vc.position else 0
+        queue_store.save_position(guild_id, vc.position or 0)
         duration = current_song.length // 1000 if hasattr(current_song, 'length') else 0
 
         # Stopp når sangen er ferdig
         if duration > 0 and elapsed > duration:
-            break
+            return None
 
-        # YouTube thumbnail hvis mulig
-        thumbnail = f"https://img.youtube.com/vi/{current_song.identifier}/hqdefault.jpg" if hasattr(current_song, 'identifier') else None
-        is_stream = getattr(current_song, 'is_stream', False)
-        progress = generate_progress_bar(elapsed, duration, is_stream=is_stream)
+        if paused:
+            # Våkn i tide til pausegrensen, men ellers sjelden.
+            until_timeout = PAUSE_DISCONNECT_TIMEOUT - (time.time() - pause_start_times[guild_id])
+            interval = min(PROGRESS_PAUSED_INTERVAL, max(1.0, until_timeout))
+        elif PROGRESS_MODE == "timestamp":
+            # Klienten teller selv; tikket ser bare etter endret kølengde.
+            interval = PROGRESS_MAX_INTERVAL
+        else:
+            # Progress-linjen har 22 steg; oftere enn ett steg gir lite å se.
+            interval = min(max(duration / 22, PROGRESS_MIN_INTERVAL), PROGRESS_MAX_INTERVAL)
+
+        # Starttidspunktet holdes fast mellom tikkene så tidsstemplene ikke flakker med et sekund.
+        drift = abs(time.time() - watch.started_at - elapsed)
+        if paused != watch.paused or (not paused and drift > PROGRESS_TIMESTAMP_DRIFT):
+            watch.started_at = int(time.time()) - elapsed
+            watch.paused = paused
+
+        new_embed = now_playing_embed(current_song, ctx, elapsed, paused=paused, started_at=watch.started_at)
+        rendered = new_embed.to_dict()
+        if rendered == watch.last_render:
+            self.edits_skipped += 1
+            return interval
+
+        wait = self._take_edit(embed_msg.channel.id)
+        if wait:
+            return wait
+        await embed_msg.edit(embed=new_embed)
+        watch.last_render = rendered
+        self.edits_sent += 1
+        return interval
 
-        new_embed = discord.Embed(
-            title=getattr(current_song, 'title', 'Ukjent sang'),
-            url=getattr(current_song, 'uri', None),
-            color=2303786
-        )
-        if thumbnail:
-            new_embed.set_thumbnail(url=thumbnail)
 
-        new_embed.set_author(name="Now Playing", icon_url="https://cdn3.emoji.gg/emojis/3468-skype-music.gif")
-        guild_queue = get_guild_queue(ctx.guild.id)
-        requester = getattr(current_song, 'requester', ctx.author)
-        new_embed.add_field(name="Requested by", value=requester.name, inline=True)
-        new_embed.add_field(name="Songs in queue", value=f"{len(guild_queue)}", inline=True)
-        new_embed.add_field(name="Progress", value=progress, inline=False)
-        await embed_msg.edit(embed=new_embed)
+progress_scheduler = ProgressScheduler()
 
 
 async def play_next(ctx):
     vc: pomice.Player | None = resolve_player(ctx.guild)
     guild_id = ctx.guild.id
+    if guild_id in advancing_guilds:
+        # En annen play_next venter allerede på neste spor; den tar også det som kommer i køen imens.
+        return
     guild_queue = get_guild_queue(guild_id)
     track_data.pop(guild_id, None)
 
@@ -745,305 +2788,312 @@ async def play_next(ctx):
         await stop_and_clear(ctx, notify=":x: Fant ikke aktiv spiller. Kobler i fra.")
         return
 
-    if guild_queue:
-        next_track = guild_queue.pop(0)
-        vc.ctx = ctx
-        await vc.play(next_track)
-        try:
-            await vc.set_volume(DEFAULT_VOLUME)
-        except Exception:
-            pass
-        await show_now_playing(next_track, ctx)
-    else:
-        await stop_and_clear(ctx, notify="K\u00f8en er tom. Kobler i fra.")
-        try:
-            await ctx.message.delete(delay=1)
-        except Exception:
-            pass
+    # Fra popleft til play står spilleren stille mens sporet slås opp; enqueue_entries skal da
+    # legge nye spor i køen i stedet for å starte dem selv.
+    advancing_guilds.add(guild_id)
+    try:
+        while guild_queue:
+            next_track = await resolve_queue_entry(guild_queue.popleft(), ctx)
+            if next_track is None:
+                # Uoppløselige elementer hoppes over uten å stoppe avspillingen.
+                continue
+            vc.ctx = ctx
+            await vc.play(next_track)
+            try:
+                await vc.set_volume(DEFAULT_VOLUME)
+            except Exception:
+                pass
+            await show_now_playing(next_track, ctx)
+            prefetch_queue(guild_id, ctx)
+            return
+    finally:
+        advancing_guilds.discard(guild_id)
 
+    await stop_and_clear(ctx, notify="K\u00f8en er tom. Kobler i fra.")
+    try:
+        await ctx.message.delete(delay=1)
+    except Exception:
+        pass
 
-focus_stream_url = "https://youtu.be/jfKfPfyJRdk"
 
+# --- Kilder for !play ---
+# Hver kilde registrerer hvilke lenketyper (fra parse_media_url) den håndterer og en async generator
+# som gir (navn, spor) side for side. Selve køleggingen, meldingene og statistikken er felles.
+class ResolveError(Exception):
+    """Oppslaget lot seg ikke gjøre; meldingen vises som den er for brukeren."""
 
-@bot.command(aliases=['PLAY', 'p', 'P'])
-async def play(ctx, *, query: str):
-    # Sjekk Lavalink uten auto-retry.
-    if not await ensure_lavalink_ready():
-        await ctx.send(":x: Lavalink er ikke tilkoblet. Kjør !reset for å prøve å koble på nytt.", delete_after=7)
-        try:
-            await ctx.message.delete(delay=1)
-        except Exception:
-            pass
-        return
-    if not await ensure_voice(ctx):
-        return
-    vc: pomice.Player | None = resolve_player(ctx.guild)
-    if not vc:
-        await ctx.send(":x: Klarte ikke å opprette Pomice-player for voice-kanalen.", delete_after=6)
-        try:
-            await ctx.message.delete(delay=1)
-        except Exception:
-            pass
-        return
-    guild_queue = get_guild_queue(ctx.guild.id)
-    if any(domain in query for domain in ("music.youtube.com/watch", "m.youtube.com/watch")):
-        if "v=" in query:
-            vid = query.split("v=")[1].split("&")[0]
-            query = f"https://www.youtube.com/watch?v={vid}"
-    # --- Apple Music enkeltspor ---
-    if "music.apple.com" in query and "/song/" in query:
-        try:
-            # Ekstraher land og ID
-            parts = query.split('/')
-            # ID sist som er heltall
-            track_id = next((p.split('?')[0] for p in reversed(parts) if p.split('?')[0].isdigit()), None)
-            if not track_id:
-                await ctx.send(":x: Fant ikke Apple Music ID i lenken.", delete_after=5)
-                await ctx.message.delete(delay=1)
-                return
-            # Cache-nøkkel
-            cache_key = f"apple:{track_id}"
-            search = await get_spotify_cache(cache_key)  # gjenbruk tabell
-            if not search:
-                meta = await fetch_apple_track(track_id, APPLE_MUSIC_COUNTRY)
-                if not meta:
-                    await ctx.send(":x: Fant ikke Apple Music metadata.", delete_after=5)
-                    await ctx.message.delete(delay=1)
-                    return
-                title, artist = meta
-                search = f"ytsearch:{title} {artist}".strip()
-                await set_spotify_cache(cache_key, search)
-            track = None
-            yt_cache = await get_youtube_cache(search)
-            if yt_cache:
-                cached_tracks = await fetch_tracks(yt_cache[1], ctx=ctx)
-                if cached_tracks:
-                    track = cached_tracks[0]
-                else:
-                    yt_cache = None
-            if not yt_cache:
-                fetched_tracks = await fetch_tracks(search, ctx=ctx)
-                if not fetched_tracks:
-                    await ctx.send(":x: Fant ikke YouTube-video.", delete_after=5)
-                    await ctx.message.delete(delay=1)
-                    return
-                track = fetched_tracks[0]
-                await set_youtube_cache(search, track.title, track.uri)
-            if track is None:
-                await ctx.send(":x: Fant ikke YouTube-video.", delete_after=5)
-                await ctx.message.delete(delay=1)
-                return
-            if not is_playing(vc):
-                vc.ctx = ctx
-                track.requester = ctx.author
-                await vc.play(track)
-                try:
-                    await vc.set_volume(DEFAULT_VOLUME)
-                except Exception:
-                    pass
-                await show_now_playing(track, ctx)
-            else:
-                track.requester = ctx.author
-                guild_queue.append(track)
-                embed = discord.Embed(title=track.title, color=2303786)
-                embed.set_author(name="Added To Queue", icon_url="https://cdn3.emoji.gg/emojis/3468-skype-music.gif")
-                embed.add_field(name="Requested by", value=ctx.author.name, inline=True)
-                embed.add_field(name="Position in queue", value=str(len(guild_queue)), inline=True)
-                await ctx.send(embed=embed, delete_after=5)
-            await ctx.message.delete(delay=1)
-        except Exception as e:
-            await ctx.send(f":x: Apple Music-feil: {e}", delete_after=6)
-            await ctx.message.delete(delay=1)
-        return
-    # --- Spotify: enkeltspor ---
-    if "open.spotify.com/track" in query:
-        try:
-            if sp is None:
-                await ctx.send(":x: Spotify-støtte er ikke konfigurert. Sett SPOTIFY_CLIENT_ID og SPOTIFY_CLIENT_SECRET i .env.", delete_after=6)
-                await ctx.message.delete(delay=1)
-                return
-            track_id = query.split("/")[-1].split("?")[0]
-            search = await get_spotify_cache(track_id)
-            if not search:
-                track = sp.track(track_id)
-                search = f"ytsearch:{track['name']} {track['artists'][0]['name']}"
-                await set_spotify_cache(track_id, search)
-            yt_cache = await get_youtube_cache(search)
-            if yt_cache:
-                track = await fetch_tracks(yt_cache[1], ctx=ctx)
-                if not track:
-                    raise Exception("YouTube-cache tom.")
-                track = track[0]
-            else:
-                results = await fetch_tracks(search, ctx=ctx)
-                if not results:
-                    await ctx.send("Fant ikke sang på YouTube.", delete_after=5)
-                    await ctx.message.delete(delay=1)
-                    return
-                track = results[0]
-                await set_youtube_cache(search, track.title, track.uri)
-            if not is_playing(vc):
-                vc.ctx = ctx
-                track.requester = ctx.author
-                await vc.play(track)
-                try:
-                    await vc.set_volume(DEFAULT_VOLUME)
-                except Exception:
-                    pass
-                await show_now_playing(track, ctx)
-            else:
-                track.requester = ctx.author
-                guild_queue.append(track)
-                SongEmbed = discord.Embed(title=f"{track.title}",  color=2303786)
-                SongEmbed.set_author(name="Added To Queue", icon_url="https://cdn3.emoji.gg/emojis/3468-skype-music.gif")
-                SongEmbed.add_field(name="Requested by", value=ctx.author.name, inline=True)
-                SongEmbed.add_field(name="\u200b", value="\u200b", inline=True)
-                SongEmbed.add_field(name="Position in queue", value=f"{len(guild_queue)}", inline=True)
-                await ctx.send(embed=SongEmbed, delete_after=5)
-                await ctx.message.delete(delay=1)
-        except Exception as e:
-            await ctx.send(f":x: Spotify-feil: {e}", delete_after=5)
-            await ctx.message.delete(delay=1)
-        return
 
-    # --- Spotify: spilleliste ---
-    elif "open.spotify.com/playlist" in query:
-        await ctx.send("🔁 Henter spilleliste... (maks 20 sanger)", delete_after=7)
-        await ctx.message.delete(delay=1)
-        try:
-            if sp is None:
-                await ctx.send(":x: Spotify-støtte er ikke konfigurert. Sett SPOTIFY_CLIENT_ID og SPOTIFY_CLIENT_SECRET i .env.", delete_after=6)
-                return
-            playlist_id = query.split("/")[-1].split("?")[0]
-            playlist_data = sp.playlist(playlist_id)
-            total_tracks = playlist_data['tracks']['total']
-            offset = max(0, total_tracks - 20)
-            results = sp.playlist_tracks(playlist_id, offset=offset, limit=20)
-
-            added = 0
-            for item in reversed(results['items']):
-                track = item['track']
-                if not track or not track.get("id"):
-                    continue
-                spotify_id = track["id"]
-
-                search = await get_spotify_cache(spotify_id)
-                if not search:
-                    search = f"ytsearch:{track['name']} {track['artists'][0]['name']}"
-                    await set_spotify_cache(spotify_id, search)
-
-                yt_cache = await get_youtube_cache(search)
-                if yt_cache:
-                    track_obj = await fetch_tracks(yt_cache[1], ctx=ctx)
-                    if not track_obj:
-                        continue
-                    track_obj = track_obj[0]
-                else:
-                    yt_results = await fetch_tracks(search, ctx=ctx)
-                    if not yt_results:
-                        continue
-                    track_obj = yt_results[0]
-                    await set_youtube_cache(search, track_obj.title, track_obj.uri)
+class SourceResolver:
+    __slots__ = ("name", "label", "resolve", "collection", "calls", "errors", "total_time")
 
-                track_obj.requester = ctx.author
-                guild_queue.append(track_obj)
-                added += 1
+    def __init__(self, name: str, label: str, resolve, *, collection: bool = False):
+        self.name = name
+        self.label = label
+        self.resolve = resolve
+        self.collection = collection
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
 
-            await ctx.send(f"✅ Lagt til {added} sanger fra Spotify-spilleliste.", delete_after=6)
-            if not is_playing(vc):
-                vc.ctx = ctx
-                await play_next(ctx)
+    @property
+    def avg_ms(self) -> float:
+        return self.total_time / self.calls * 1000 if self.calls else 0.0
 
-        except Exception as e:
-            await ctx.send(f":x: Klarte ikke hente spilleliste: {e}", delete_after=6)
-        return
 
-    # --- YouTube: spilleliste ---
-    if "list=" in query and ("youtube.com" in query or "youtu.be" in query):
+source_resolvers: dict[str | None, SourceResolver] = {}  # parse_media_url-kilde -> resolver, None = søk/annen lenke
+
+
+def source_resolver(kinds, label: str, *, collection: bool = False):
+    """Registrer en kilde for en eller flere lenketyper, f.eks. ("spotify:album", "Spotify-album")."""
+    def decorator(fn):
+        for kind in (kinds if isinstance(kinds, tuple) else (kinds,)):
+            kind_label = label(kind) if callable(label) else label
+            source_resolvers[kind] = SourceResolver(kind or "søk", kind_label, fn, collection=collection)
+        return fn
+    return decorator
+
+
+def _require_spotify():
+    if sp is None:
+        raise ResolveError(":x: Spotify-støtte er ikke konfigurert. Sett SPOTIFY_CLIENT_ID og SPOTIFY_CLIENT_SECRET i .env.")
+
+
+SPOTIFY_KIND_LABELS = {"playlist": "spilleliste", "album": "album", "artist": "artist"}
+APPLE_KIND_LABELS = {"album": "album", "playlist": "spilleliste"}
+
+
+@source_resolver("apple:song", "Apple Music")
+async def resolve_apple_song(ctx, query: str, track_id: str):
+    if not track_id.isdigit():
+        raise ResolveError(":x: Fant ikke Apple Music ID i lenken.")
+    apple_link = APPLE_MUSIC_RE.search(query)
+    country = (apple_link.group(1) if apple_link else None) or APPLE_MUSIC_COUNTRY
+    cache_key = f"apple:{track_id}"
+    search = await get_spotify_cache(cache_key)  # gjenbruk tabell
+    if not search:
+        meta = None
+        if not await get_negative_cache(cache_key):
+            meta = await lookups.do(f"apple:{country}:{track_id}", lambda: fetch_apple_track(track_id, country))
+            if not meta:
+                await set_negative_cache(cache_key, NEGATIVE_NO_METADATA)
+        if not meta:
+            raise ResolveError(":x: Fant ikke Apple Music metadata.")
+        search = await recording_search(*meta)
+        await set_spotify_cache(cache_key, search)
+    track = await resolve_youtube_search(search, ctx=ctx)
+    yield None, [track] if track else []
+
+
+@source_resolver(("apple:album", "apple:playlist"), lambda kind: f"Apple Music-{APPLE_KIND_LABELS[kind[6:]]}", collection=True)
+async def resolve_apple_collection(ctx, query: str, collection_id: str):
+    apple_link = APPLE_MUSIC_RE.search(query)
+    country = apple_link.group(1) or APPLE_MUSIC_COUNTRY
+    if apple_link.group(2) == "album":
+        name, songs = await fetch_apple_album(collection_id, country)
+    else:
+        # parse_media_url godtar lenker uten https://, men aiohttp trenger en fullstendig URL.
         playlist_url = query.strip()
+        if not urlparse(playlist_url).scheme:
+            playlist_url = f"https://{playlist_url}"
+        name, songs = await fetch_apple_playlist(playlist_url, country)
+    yield name, await pending_tracks("apple", songs, ctx.author.id)
+
+
+@source_resolver("spotify:track", "Spotify")
+async def resolve_spotify_track(ctx, query: str, track_id: str):
+    _require_spotify()
+    search = await get_spotify_cache(track_id)
+    if not search:
+        track = await lookups.do(f"spotify:track:{track_id}", lambda: spotify_call(sp.track, track_id))
+        search = await recording_search(track["name"], track["artists"][0]["name"], _spotify_isrc(track))
+        await set_spotify_cache(track_id, search)
+    track = await resolve_youtube_search(search, ctx=ctx)
+    yield None, [track] if track else []
+
+
+@source_resolver(
+    ("spotify:playlist", "spotify:album", "spotify:artist"),
+    lambda kind: f"Spotify-{SPOTIFY_KIND_LABELS[kind[8:]]}",
+    collection=True,
+)
+async def resolve_spotify_collection(ctx, query: str, collection_id: str):
+    _require_spotify()
+    kind = parse_media_url(query)[0][len("spotify:"):]
+    added = 0
+    async for name, tracks in iter_spotify_collection(kind, collection_id):
+        if SPOTIFY_MAX_IMPORT:
+            tracks = tracks[:SPOTIFY_MAX_IMPORT - added]
+        added += len(tracks)
+        yield name, await pending_spotify_tracks(tracks, ctx.author.id)
+        if SPOTIFY_MAX_IMPORT and added >= SPOTIFY_MAX_IMPORT:
+            break
 
-        # Normaliser youtu.be-lenker slik at Lavalink gjenkjenner spillelisteparametere
-        if "youtu.be/" in playlist_url:
-            base, _, params = playlist_url.partition("?")
-            video_id = base.rsplit("/", 1)[-1]
-            if params:
-                playlist_url = f"https://www.youtube.com/watch?v={video_id}&{params}"
-            else:
-                playlist_url = f"https://www.youtube.com/watch?v={video_id}"
 
-        try:
-            fetched = await fetch_tracks(playlist_url, ctx=ctx)
-        except Exception as e:
-            await ctx.send(f":x: Klarte ikke hente YouTube-spilleliste: {e}", delete_after=6)
-            await ctx.message.delete(delay=1)
-            return
+@source_resolver("youtube:playlist", "YouTube-spilleliste", collection=True)
+async def resolve_youtube_playlist(ctx, query: str, playlist_id: str):
+    playlist_url = query.strip()
+    if not urlparse(playlist_url).scheme:
+        playlist_url = f"https://{playlist_url}"
 
-        if hasattr(fetched, "tracks"):
-            tracks = list(fetched.tracks)
-            playlist_name = getattr(fetched, "name", None)
+    # Normaliser youtu.be-lenker slik at Lavalink gjenkjenner spillelisteparametere
+    if "youtu.be/" in playlist_url:
+        base, _, params = playlist_url.partition("?")
+        video_id = base.rsplit("/", 1)[-1]
+        if params:
+            playlist_url = f"https://www.youtube.com/watch?v={video_id}&{params}"
         else:
-            tracks = list(fetched) if isinstance(fetched, list) else []
-            playlist_name = None
+            playlist_url = f"https://www.youtube.com/watch?v={video_id}"
 
-        if not tracks:
-            await ctx.send(":x: Fant ingen spor i spillelisten.", delete_after=5)
-            await ctx.message.delete(delay=1)
-            return
+    # Samme spilleliste lagt inn i flere guilds samtidig hentes én gang. Sporene gjøres om til
+    # QueueEntry før de legges i køen, så det delte Playlist-objektet endres aldri.
+    fetched = await fetch_tracks_shared(playlist_url, ctx=ctx)
+    if hasattr(fetched, "tracks"):
+        yield getattr(fetched, "name", None), list(fetched.tracks)
+    else:
+        yield None, list(fetched) if isinstance(fetched, list) else []
+
+
+@source_resolver("youtube", "YouTube")
+async def resolve_youtube_video(ctx, query: str, video_id: str):
+    # Alle varianter av en videolenke deler cacheoppføringen 'youtube:<id>'.
+    track = await resolve_youtube_search(query, ctx=ctx)
+    yield None, [track] if track else []
+
+
+@source_resolver(None, "Søk")
+async def resolve_search(ctx, query: str, _):
+    if urlparse(query).scheme:
+        tracks = await fetch_tracks_shared(query, ctx=ctx)
+        if hasattr(tracks, "tracks"):
+            # Playlist-svar deles uendret mellom kallerne; sporet som spilles får sin egen kopi.
+            tracks = [copy.copy(track) for track in tracks.tracks[:1]]
+            for track in tracks:
+                track.ctx = ctx
+        yield None, list(tracks or [])[:1]
+    else:
+        # Fritekstsøk går via samme cache som Spotify/Apple, så gjentatte søk slipper Lavalink.
+        track = await resolve_youtube_search(query, ctx=ctx, max_age=SEARCH_CACHE_TTL)
+        yield None, [track] if track else []
+
+
+async def start_track(ctx, vc: pomice.Player, track):
+    vc.ctx = ctx
+    await vc.play(track)
+    try:
+        await vc.set_volume(DEFAULT_VOLUME)
+    except Exception:
+        pass
+    await show_now_playing(track, ctx)
+
+
+async def enqueue_entries(ctx, vc: pomice.Player, entries: list, *, announce: bool):
+    """Felles kølegging: start avspilling hvis spilleren står stille, ellers legg i køen.
 
-        for t in tracks:
-            t.requester = ctx.author
-        first_track, remaining_tracks = tracks[0], tracks[1:]
-        if not is_playing(vc):
+    entries er pomice.Track eller QueueEntry; køen lagrer bare kompakte QueueEntry.
+    """
+    guild_queue = get_guild_queue(ctx.guild.id)
+    # Mens play_next henter neste spor, regnes spilleren som opptatt.
+    idle = not is_playing(vc) and ctx.guild.id not in advancing_guilds
+    if announce and idle:
+        track = entries[0]
+        track.requester = ctx.author
+        await start_track(ctx, vc, track)
+        return
+    entries = [
+        entry if isinstance(entry, QueueEntry) else QueueEntry.from_track(entry)
+        for entry in entries
+    ]
+    for entry in entries:
+        entry.requester_id = ctx.author.id
+    guild_queue.extend(entries)
+    if not announce:
+        if idle:
             vc.ctx = ctx
-            await vc.play(first_track)
-            try:
-                await vc.set_volume(DEFAULT_VOLUME)
-            except Exception:
-                pass
-            await show_now_playing(first_track, ctx)
-            guild_queue.extend(remaining_tracks)
+            await play_next(ctx)
         else:
-            guild_queue.extend(tracks)
-
-        info_name = f" **{playlist_name}**" if playlist_name else ""
-        await ctx.send(f"✅ Lagt til {len(tracks)} sanger fra YouTube-spilleliste{info_name}.", delete_after=6)
-        await ctx.message.delete(delay=1)
+            prefetch_queue(ctx.guild.id, ctx)
         return
-
-    # --- Vanlig YouTube-søk ---
-    if (query.startswith("https://www.youtube.com/watch") or query.startswith("https://youtu.be/")) and "list=" not in query:
-        query = query.split("&")[0]
+    eta = queue_eta_ms(ctx.guild.id, len(guild_queue) - 1)
+    SongEmbed = discord.Embed(title=f"{entries[0].title}",  color=2303786)
+    SongEmbed.set_author(name="Added To Queue", icon_url="https://cdn3.emoji.gg/emojis/3468-skype-music.gif")
+    SongEmbed.add_field(name="Requested by", value=ctx.author.name, inline=True)
+    eta_text = f"<t:{int(time.time() + eta / 1000)}:R>"
+    if guild_queue.unresolved:
+        # Uoppløste spor foran i køen teller som 0 ms, så starttiden er tidligst dette.
+        eta_text = f"tidligst {eta_text}"
+    SongEmbed.add_field(name="Estimated start", value=eta_text, inline=True)
+    SongEmbed.add_field(name="Position in queue", value=f"{len(guild_queue)}", inline=True)
+    await ctx.send(embed=SongEmbed, delete_after=5)
+
+
+async def run_resolver(ctx, vc: pomice.Player, resolver: SourceResolver, query: str, media_id: str | None):
+    """Kjør en kilde og legg resultatet i køen. Tid og feil telles per kilde."""
+    if resolver.collection:
+        await ctx.send(f"🔁 Henter {resolver.label}...", delete_after=7)
+    added = 0
+    collection_name = None
+    pages = resolver.resolve(ctx, query, media_id)
     try:
-        tracks = await fetch_tracks(query, ctx=ctx)
+        while True:
+            # Bare kildens egen tid måles; avspilling og Discord-meldinger i enqueue_entries holdes utenfor.
+            started = time.perf_counter()
+            try:
+                name, entries = await anext(pages)
+            except StopAsyncIteration:
+                break
+            finally:
+                resolver.total_time += time.perf_counter() - started
+            collection_name = name or collection_name
+            if entries:
+                # Samlinger legges i køen side for side; avspilling starter etter første side.
+                await enqueue_entries(ctx, vc, entries, announce=not resolver.collection)
+                added += len(entries)
+    except ResolveError as e:
+        await ctx.send(str(e), delete_after=6)
+        return
     except Exception as e:
-        await ctx.send(f"Feil ved henting av sang: {e}", delete_after=5)
-        await ctx.message.delete(delay=1)
+        resolver.errors += 1
+        await ctx.send(f":x: {resolver.label}-feil: {e}", delete_after=6)
         return
+    finally:
+        resolver.calls += 1
+        await pages.aclose()
 
-    if not tracks:
-        await ctx.send("Fant ingen resultater.", delete_after=5)
-        await ctx.message.delete(delay=1)
-        return
+    if not added:
+        where = f" i {resolver.label}" if resolver.collection else ""
+        await ctx.send(f":x: Fant ingen resultater{where}.", delete_after=6)
+    elif resolver.collection:
+        info_name = f" **{collection_name}**" if collection_name else ""
+        await ctx.send(f"✅ Lagt til {added} sanger fra {resolver.label}{info_name}.", delete_after=6)
 
-    track = tracks[0]
-    track.requester = ctx.author
-    if not is_playing(vc):
-        vc.ctx = ctx
-        await vc.play(track)
+
+focus_stream_url = "https://youtu.be/jfKfPfyJRdk"
+
+
+@bot.command(aliases=['PLAY', 'p', 'P'])
+async def play(ctx, *, query: str):
+    # Sjekk Lavalink uten auto-retry.
+    if not await ensure_lavalink_ready():
+        await ctx.send(":x: Lavalink er ikke tilkoblet. Kjør !reset for å prøve å koble på nytt.", delete_after=7)
         try:
-            await vc.set_volume(DEFAULT_VOLUME)
+            await ctx.message.delete(delay=1)
         except Exception:
             pass
-        await show_now_playing(track, ctx)
-    else:
-        guild_queue.append(track)
-        SongEmbed = discord.Embed(title=f"{track.title}",  color=2303786)
-        SongEmbed.set_author(name="Added To Queue", icon_url="https://cdn3.emoji.gg/emojis/3468-skype-music.gif")
-        SongEmbed.add_field(name="Requested by", value=ctx.author.name, inline=True)
-        SongEmbed.add_field(name="\u200b", value="\u200b", inline=True)
-        SongEmbed.add_field(name="Position in queue", value=f"{len(guild_queue)}", inline=True)
-        await ctx.send(embed=SongEmbed, delete_after=5)
+        return
+    if not await ensure_voice(ctx):
+        return
+    vc: pomice.Player | None = resolve_player(ctx.guild)
+    if not vc:
+        await ctx.send(":x: Klarte ikke å opprette Pomice-player for voice-kanalen.", delete_after=6)
+        try:
+            await ctx.message.delete(delay=1)
+        except Exception:
+            pass
+        return
+    media_source, media_id = parse_media_url(query) or (None, None)
+    resolver = source_resolvers.get(media_source) or source_resolvers[None]
     await ctx.message.delete(delay=1)
+    await run_resolver(ctx, vc, resolver, query, media_id)
 
 
 async def ensure_voice(ctx):
@@ -1070,7 +3120,7 @@ async def ensure_voice(ctx):
     vc = resolve_player(ctx.guild)
     if not vc or not getattr(vc, "channel", None):
         vc = await voice_channel.connect(
-            cls=pomice.Player,
+            cls=OnalPlayer,
             self_deaf=True,
             reconnect=True,
             timeout=VOICE_CONNECT_TIMEOUT,
@@ -1107,11 +3157,20 @@ async def ensure_voice(ctx):
     return True
 
 
+queues_restored = False
+
+
 @bot.event
 async def on_ready():
     print(f"Logget inn som {bot.user.name}")
     await init_cache_db()
-    await ensure_lavalink_ready()
+    start_cache_maintenance()
+    start_spotify_token_refresh()
+    global queues_restored
+    if await ensure_lavalink_ready() and QUEUE_RESTORE and not queues_restored:
+        # on_ready kan komme flere ganger (ny gateway-økt); køene gjenopptas bare første gang.
+        queues_restored = True
+        await restore_saved_queues()
 
 @bot.event
 async def on_pomice_track_end(player, track, reason):
@@ -1163,8 +3222,9 @@ async def queue(ctx):
         await ctx.send("\U0001F500 Køen er tom.", delete_after=3)
         await ctx.message.delete(delay=1)
     else:
-        description = "\n".join([f"{idx + 1}. {track.title}" for idx, track in enumerate(guild_queue)])
+        description = queue_lines(guild_queue)
         embed = discord.Embed(title="Musikk-kø", description=description, color=discord.Color.blue())
+        embed.set_footer(text=f"{len(guild_queue)} sanger · {queue_duration_text(guild_queue)}")
         await ctx.send(embed=embed, delete_after=10)
         await ctx.message.delete(delay=1)
 
@@ -1202,8 +3262,7 @@ async def prioritize(ctx, index: int):
         await ctx.send(f":x: Ugyldig indeks. Velg et tall mellom 1 og {len(guild_queue)}", delete_after=5)
         return
 
-    track = guild_queue.pop(index - 1)
-    guild_queue.insert(0, track)
+    track = guild_queue.move(index - 1, 0)
     await ctx.message.delete(delay=1)
     await ctx.send(f"⏫ **{track.title}** er flyttet til toppen av køen!", delete_after=5)
 
@@ -1216,24 +3275,46 @@ async def shuffle(ctx):
         await ctx.message.delete(delay=1)
         return
 
-    from random import shuffle as rnd_shuffle
-    rnd_shuffle(guild_queue)
+    guild_queue.shuffle()
     await ctx.send("🔀 Køen er shufflet!", delete_after=5)
     await ctx.message.delete(delay=1)
 
 
 @bot.command()
 async def showcache(ctx):
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("SELECT COUNT(*) FROM spotify_cache") as cursor:
-            spotify_count = (await cursor.fetchone())[0]
-
-        async with db.execute("SELECT COUNT(*) FROM youtube_cache") as cursor:
-            youtube_count = (await cursor.fetchone())[0]
+    spotify_count, youtube_count, recording_count = await count_cache_rows()
+    mem = memory_cache_stats()
 
     embed = discord.Embed(title="🎶 Cache-status", color=discord.Color.green())
     embed.add_field(name="Spotify-ID ➜ YouTube-søk", value=str(spotify_count), inline=False)
     embed.add_field(name="YouTube-søk ➜ Direktelenke", value=str(youtube_count), inline=False)
+    embed.add_field(name="ISRC ➜ YouTube-søk", value=str(recording_count), inline=False)
+    embed.add_field(
+        name="🧠 Minne",
+        value=f"Oppføringer: {mem['entries']}\nTreff: {mem['hits']} · Bom: {mem['misses']} · Utkastet: {mem['evictions']}",
+        inline=False,
+    )
+    embed.add_field(
+        name="💽 Disk",
+        value=(
+            f"Treff: {disk_cache_stats['hits']} · Bom: {disk_cache_stats['misses']} · "
+            f"Utkastet: {disk_cache_stats['evictions']}"
+        ),
+        inline=False,
+    )
+    embed.add_field(
+        name="🚫 Negativ cache",
+        value=f"Treff: {negative_cache_stats['hits']} · Lagret: {negative_cache_stats['stored']}",
+        inline=False,
+    )
+    lookups_total = mem["hits"] + mem["misses"]
+    hit_rate = (mem["hits"] + disk_cache_stats["hits"]) / lookups_total if lookups_total else 0
+    embed.add_field(
+        name="🎯 Treffrate",
+        value=f"{hit_rate:.0%} av {lookups_total} oppslag",
+        inline=False,
+    )
+    embed.add_field(name="🔗 Sammenslåtte oppslag", value=f"Spart: {lookups.saved}", inline=False)
     await ctx.send(embed=embed, delete_after=15)
     await ctx.message.delete(delay=1)
 
@@ -1241,10 +3322,16 @@ async def showcache(ctx):
 @bot.command()
 @commands.has_permissions(administrator=True)
 async def clearcache(ctx):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("DELETE FROM spotify_cache")
-        await db.execute("DELETE FROM youtube_cache")
-        await db.commit()
+    spotify_memory_cache.clear()
+    youtube_memory_cache.clear()
+    recording_memory_cache.clear()
+    negative_memory_cache.clear()
+    db = await get_cache_db()
+    await db.execute("DELETE FROM spotify_cache")
+    await db.execute("DELETE FROM youtube_cache")
+    await db.execute("DELETE FROM recording_cache")
+    await db.execute("DELETE FROM negative_cache")
+    await db.commit()
     await ctx.send("🧹 Cache ble tømt!", delete_after=10)
     await ctx.message.delete(delay=1)
 
@@ -1276,44 +3363,51 @@ async def info(ctx):
 @bot.command(aliases=["ping", "status", "health"])
 async def healthcheck(ctx):
     try:
-        node = get_lavalink_node()
-        stats = getattr(node, "stats", None)
-
-        players = _stat_value(stats, "players")
-        if players is None:
-            players = getattr(node, "player_count", None)
-
-        used = _stat_value(stats, "memory", "used")
-        allocated = _stat_value(stats, "memory", "allocated")
-        uptime_ms = _stat_value(stats, "uptime")
-        ping = getattr(node, "ping", None)
-
-        lines = ["🟢 Tilkoblet" if getattr(node, "is_connected", False) else "⚠️ Ikke tilkoblet"]
-        if players is not None:
-            lines.append(f"• Spillere: {players}")
-        if used is not None and allocated is not None:
-            lines.append(f"• RAM: {used // 1024**2}MB / {allocated // 1024**2}MB")
-        if uptime_ms is not None:
-            lines.append(f"• Uptime: {_format_uptime_ms(uptime_ms)}")
-        if ping is not None:
-            lines.append(f"• Ping: {ping}ms")
-        lavalink_info = "\n".join(lines)
+        nodes = list(pomice.NodePool._nodes.values())
+        await _measure_node_pings([node for node in nodes if node.is_connected])
+        blocks = []
+        for node in nodes:
+            stats = getattr(node, "stats", None)
+
+            players = _stat_value(stats, "players_total")
+            if players is None:
+                players = getattr(node, "player_count", None)
+
+            used = _stat_value(stats, "used")
+            allocated = _stat_value(stats, "allocated")
+            cpu_load = _stat_value(stats, "cpu_system_load")
+            uptime_ms = _stat_value(stats, "uptime")
+            ping = node_pings.get(node._identifier)
+            region = lavalink_regions.get(node._identifier)
+
+            status = "🟢" if node.is_connected else "⚠️ Ikke tilkoblet ·"
+            lines = [f"{status} **{node._identifier}**" + (f" ({region})" if region else "")]
+            if players is not None:
+                lines.append(f"• Spillere: {players}")
+            if cpu_load is not None:
+                lines.append(f"• CPU: {cpu_load:.0%}")
+            if used is not None and allocated is not None:
+                lines.append(f"• RAM: {used // 1024**2}MB / {allocated // 1024**2}MB")
+            if uptime_ms is not None:
+                lines.append(f"• Uptime: {_format_uptime_ms(uptime_ms)}")
+            if ping is not None:
+                lines.append(f"• Ping: {ping[0]:.0f}ms")
+            blocks.append("\n".join(lines))
+        lavalink_info = "\n".join(blocks) or "⚠️ Ikke tilkoblet"
+        if node_watchdog.migrated or node_watchdog.failed:
+            lavalink_info += f"\n🔁 Flyttet: {node_watchdog.migrated} · Ga opp: {node_watchdog.failed}"
     except Exception as e:
         lavalink_info = f"🔴 Lavalink-feil: `{e}`"
 
     # Cache
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("SELECT COUNT(*) FROM spotify_cache") as cursor:
-            spotify_count = (await cursor.fetchone())[0]
-        async with db.execute("SELECT COUNT(*) FROM youtube_cache") as cursor:
-            youtube_count = (await cursor.fetchone())[0]
+    spotify_count, youtube_count, recording_count = await count_cache_rows()
 
     # Spotify test
     if sp is None:
         spotify_status = "⚠️ Spotify ikke konfigurert"
     else:
         try:
-            test = sp.track("3n3Ppam7vgaVa1iaRUc9Lp")  # Random test-ID
+            test = await spotify_call(sp.track, "3n3Ppam7vgaVa1iaRUc9Lp")  # Random test-ID
             spotify_status = f"🟢 Spotify OK"
         except Exception as e:
             spotify_status = f"🔴 Spotify-feil: `{e}`"
@@ -1321,8 +3415,21 @@ async def healthcheck(ctx):
     embed = discord.Embed(title="📊 Systemstatus", color=discord.Color.green())
     embed.add_field(name="🎧 Lavalink", value=lavalink_info, inline=False)
     embed.add_field(name="🎶 Spotify", value=spotify_status, inline=False)
-    embed.add_field(name="💽 Cache", value=f"Spotify: {spotify_count}\nYouTube: {youtube_count}", inline=False)
+    embed.add_field(name="💽 Cache", value=f"Spotify: {spotify_count}\nYouTube: {youtube_count}\nISRC: {recording_count}", inline=False)
     embed.add_field(name="🔊 Voice", value="✅ Tilkoblet" if resolve_player(ctx.guild) else "⚠️ Ikke tilkoblet", inline=False)
+    resolver_lines = [
+        f"• {r.name}: {r.calls} kall · {r.avg_ms:.0f}ms snitt · {r.errors} feil"
+        for r in source_resolvers.values() if r.calls
+    ]
+    embed.add_field(
+        name="✏️ Now playing-redigeringer",
+        value=(
+            f"Modus: {PROGRESS_MODE} · Sendt: {progress_scheduler.edits_sent} · "
+            f"Hoppet over: {progress_scheduler.edits_skipped}"
+        ),
+        inline=False,
+    )
+    embed.add_field(name="🧭 Kilder", value="\n".join(resolver_lines) or "Ingen oppslag ennå", inline=False)
 
     await ctx.send(embed=embed, delete_after=20)
     await ctx.message.delete(delay=1)
@@ -1331,9 +3438,27 @@ async def healthcheck(ctx):
 @bot.command()
 @commands.has_permissions(administrator=True)
 async def reset(ctx):
+    # Ta vare på køen og sporet som spilles, så reset ikke kaster dem.
+    vc = resolve_player(ctx.guild)
+    current = track_data.get(ctx.guild.id)
+    snapshot = None
+    if vc and getattr(vc, "channel", None) and current:
+        song = current[0]
+        requester_id = getattr(getattr(song, "requester", None), "id", None)
+        snapshot = (
+            vc.channel,
+            QueueEntry.from_track(song, requester_id),
+            int(vc.position or 0),
+            list(get_guild_queue(ctx.guild.id)),
+        )
     await stop_and_clear(ctx)
     # Forsøk å koble Lavalink på nytt (manuell trigger)
     success = await connect_lavalink()
+    if success and snapshot:
+        try:
+            await resume_playback(ctx, *snapshot)
+        except Exception as e:
+            print(f"[Kø] Klarte ikke gjenoppta etter reset: {e}")
     status_txt = "Tilkoblet." if success else "Kunne ikke koble til Lavalink. Prøv igjen senere."
     await ctx.send(f"🔄 Server-reset ferdig. {status_txt}", delete_after=8)
     try:
@@ -1405,14 +3530,12 @@ async def on_member_join(member):
     # Load the profile picture
     if member.avatar:
         profile_pic_url = member.avatar.url
-        response = requests.get(profile_pic_url)
-        img = Image.open(BytesIO(response.content)).convert("RGBA")
+        img = Image.open(BytesIO(await http_get_bytes(profile_pic_url))).convert("RGBA")
         img = img.resize((330, 330))
     else:
         discriminator = int(member.discriminator)
         url = f"https://cdn.discordapp.com/embed/avatars/{discriminator % 5}.png"
-        response = requests.get(url)
-        img = Image.open(BytesIO(response.content)).convert("RGBA")
+        img = Image.open(BytesIO(await http_get_bytes(url))).convert("RGBA")
         img = img.resize((330, 330))
 
     # Create a circular mask
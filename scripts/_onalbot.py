@@ -0,0 +1,21 @@
+"""Laster OnalBot.py uten å starte botten, for benchmark- og testskriptene i scripts/."""
+import os
+import sys
+import tempfile
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load(db_path: str | None = None) -> types.ModuleType:
+    path = os.path.join(ROOT, "OnalBot.py")
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    # Alt før oppstartsblokken nederst: definisjonene, men ingen bot.run().
+    source = source[:source.rindex("if not DISCORD_TOKEN:")]
+    module = types.ModuleType("OnalBot")
+    module.__file__ = path
+    sys.modules["OnalBot"] = module
+    exec(compile(source, path, "exec"), module.__dict__)
+    module.DB_PATH = db_path or os.path.join(tempfile.mkdtemp(prefix="onalbot-"), "music_cache.db")
+    return module
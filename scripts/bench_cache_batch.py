@@ -0,0 +1,71 @@
+"""Batch-API mot enkeltoppslag for en spilleliste: get/set_*_cache én og én mot get/set_*_cache_many.
+
+    python scripts/bench_cache_batch.py [antall spor]
+"""
+import asyncio
+import sys
+import time
+
+from _onalbot import load
+
+
+def fake_track(bot, i: int):
+    info = {
+        "title": f"Song {i}", "author": "", "uri": f"https://www.youtube.com/watch?v={i:011d}",
+        "identifier": f"{i:011d}", "length": 180000, "isStream": False, "isSeekable": True,
+        "position": 0, "sourceName": "youtube",
+    }
+    return bot.pomice.Track(track_id=f"ENC{i}", info=info, track_type=bot.pomice.TrackType.YOUTUBE)
+
+
+async def timed(label: str, count: int, coro_factory):
+    started = time.perf_counter()
+    await coro_factory()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {elapsed * 1000:8.1f} ms  ({count / elapsed:8.0f} spor/s)")
+    return elapsed
+
+
+async def main(count: int):
+    bot = load()
+    await bot.init_cache_db()
+    spotify = {f"sp{i}": f"ytsearch:song {i}" for i in range(count)}
+    youtube = {f"ytsearch:song {i}": fake_track(bot, i) for i in range(count)}
+
+    async def set_single():
+        for key, value in spotify.items():
+            await bot.set_spotify_cache(key, value)
+        for key, track in youtube.items():
+            await bot.set_youtube_cache(key, track)
+
+    async def set_many():
+        await bot.set_spotify_cache_many(spotify)
+        await bot.set_youtube_cache_many(youtube)
+
+    async def get_single():
+        for key in spotify:
+            await bot.get_spotify_cache(key)
+        for key in youtube:
+            await bot.get_youtube_cache(key)
+
+    async def get_many():
+        await bot.get_spotify_cache_many(list(spotify))
+        await bot.get_youtube_cache_many(list(youtube))
+
+    def cold():
+        # Minnelaget tømmes, så begge veiene måles mot SQLite.
+        bot.spotify_memory_cache.clear()
+        bot.youtube_memory_cache.clear()
+
+    write_single = await timed("Skriving, én og én", count, set_single)
+    write_many = await timed("Skriving, *_cache_many", count, set_many)
+    cold()
+    read_single = await timed("Lesing, én og én (kald)", count, get_single)
+    cold()
+    read_many = await timed("Lesing, *_cache_many (kald)", count, get_many)
+    print(f"Skriving {write_single / write_many:.1f}x raskere, lesing {read_single / read_many:.1f}x raskere i batch")
+    await bot.shutdown_cache()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))
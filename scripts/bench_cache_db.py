@@ -0,0 +1,49 @@
+"""Oppslag per sekund mot spotify_cache: ny tilkobling per oppslag (gammel kode) mot én delt tilkobling.
+
+    python scripts/bench_cache_db.py [antall oppslag]
+"""
+import asyncio
+import random
+import sys
+import time
+
+import aiosqlite
+
+from _onalbot import load
+
+SQL = "SELECT yt_query FROM spotify_cache WHERE spotify_id = ?"
+
+
+async def main(count: int):
+    bot = load()
+    await bot.init_cache_db()
+    db = await bot.get_cache_db()
+    await db.executemany(
+        "INSERT INTO spotify_cache (spotify_id, yt_query) VALUES (?, ?)",
+        [(f"id{i}", f"ytsearch:song {i}") for i in range(count)],
+    )
+    await db.commit()
+    keys = [f"id{i}" for i in range(count)]
+    random.shuffle(keys)
+
+    # Slik get_spotify_cache så ut før: connect/close rundt hvert oppslag.
+    started = time.perf_counter()
+    for key in keys:
+        async with aiosqlite.connect(bot.DB_PATH) as conn:
+            async with conn.execute(SQL, (key,)) as cursor:
+                await cursor.fetchone()
+    per_call = count / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for key in keys:
+        async with db.execute(SQL, (key,)) as cursor:
+            await cursor.fetchone()
+    shared = count / (time.perf_counter() - started)
+
+    print(f"Tilkobling per oppslag: {per_call:8.0f} oppslag/s")
+    print(f"Delt tilkobling:        {shared:8.0f} oppslag/s  ({shared / per_call:.1f}x)")
+    await bot.shutdown_cache()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
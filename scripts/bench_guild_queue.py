@@ -0,0 +1,59 @@
+"""GuildQueue mot list for køoperasjonene botten bruker, ved 10k og 100k elementer.
+
+    python scripts/bench_guild_queue.py [operasjoner per måling]
+"""
+import sys
+import time
+
+from _onalbot import load
+
+SIZES = (10_000, 100_000)
+PAGE = 10
+
+
+def operations(size: int) -> dict:
+    middle = size // 2
+
+    def rotate(queue):
+        queue.append(queue.popleft() if hasattr(queue, "popleft") else queue.pop(0))
+
+    def move_to_front(queue):
+        if hasattr(queue, "move"):
+            queue.move(middle, 0)
+        else:
+            queue.insert(0, queue.pop(middle))
+
+    def pop_middle(queue):
+        queue.append(queue.pop(middle))
+
+    def page(queue):
+        queue[middle:middle + PAGE]
+
+    return {
+        "popleft + append": rotate,
+        "flytt midten først": move_to_front,
+        "pop(i) + append": pop_middle,
+        f"side på {PAGE} fra midten": page,
+    }
+
+
+def timed(queue, operation, count: int) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        operation(queue)
+    return (time.perf_counter() - started) * 1000
+
+
+def main(count: int):
+    bot = load()
+    print(f"{'':<24} {'elementer':>9} {'GuildQueue':>12} {'list':>12}  (ms per {count} operasjoner)")
+    for size in SIZES:
+        entries = [bot.QueueEntry(f"Sang {i}", encoded=f"ENC{i}", length=180_000) for i in range(size)]
+        for label, operation in operations(size).items():
+            guild_queue = timed(bot.GuildQueue(entries), operation, count)
+            plain = timed(list(entries), operation, count)
+            print(f"{label:<24} {size:>9} {guild_queue:>12.2f} {plain:>12.2f}  ({plain / guild_queue:.2f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,46 @@
+"""Minne for en kø på 10k spor: pomice.Track mot QueueEntry, målt med tracemalloc.
+
+    python scripts/bench_queue_memory.py [antall spor]
+"""
+import gc
+import sys
+import tracemalloc
+
+from _onalbot import load
+
+
+def lavalink_track(bot, i: int):
+    # Omtrent som et YouTube-svar fra Lavalink v4; kodede spor er typisk 150-300 tegn.
+    identifier = f"{i:011d}"
+    info = {
+        "identifier": identifier, "isSeekable": True, "author": f"Artist {i}", "length": 213_000,
+        "isStream": False, "position": 0, "title": f"Artist {i} - Song {i} (Official Video)",
+        "uri": f"https://www.youtube.com/watch?v={identifier}",
+        "artworkUrl": f"https://i.ytimg.com/vi/{identifier}/maxresdefault.jpg", "isrc": None, "sourceName": "youtube",
+    }
+    encoded = f"QAAA{identifier}" + "x" * 220
+    return bot.pomice.Track(track_id=encoded, info=info, track_type=bot.pomice.TrackType.YOUTUBE)
+
+
+def measured(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def main(count: int):
+    bot = load()
+    tracks = measured(lambda: [lavalink_track(bot, i) for i in range(count)])
+    # Sporene kastes etter from_track, slik køen gjør; bare det QueueEntry beholder blir igjen.
+    entries = measured(lambda: [bot.QueueEntry.from_track(lavalink_track(bot, i)) for i in range(count)])
+    print(f"{count} spor som pomice.Track: {tracks / 1e6:6.1f} MB")
+    print(f"{count} spor som QueueEntry:   {entries / 1e6:6.1f} MB  ({tracks / entries:.1f}x mindre)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,111 @@
+"""Kildene i !play mot en stubbet Lavalink-node (og stubbet Spotify) med fast nettverksforsinkelse.
+
+Måler det !healthcheck viser per kilde (snitt-ms), kaldt og varmt, og at tiden brukt i
+enqueue_entries (avspilling, Discord-meldinger) ikke regnes med.
+
+    python scripts/bench_resolvers.py [runder]
+"""
+import asyncio
+import sys
+import time
+
+from _onalbot import load
+
+LAVALINK_DELAY = 0.020  # sekunder per /loadtracks
+SPOTIFY_DELAY = 0.030   # sekunder per Spotify API-kall
+ENQUEUE_DELAY = 0.050   # sekunder enqueue_entries later som den bruker (play + Discord)
+
+
+class FakePlaylist:
+    def __init__(self, name, tracks):
+        self.name = name
+        self.tracks = tracks
+
+
+class FakeNode:
+    _identifier = "bench"
+    _available = True
+    is_connected = True
+    stats = None
+    players = {}
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.calls = 0
+
+    def track(self, key: str):
+        info = {
+            "title": key, "author": "", "uri": f"https://www.youtube.com/watch?v={abs(hash(key)) % 10**11:011d}",
+            "identifier": f"{abs(hash(key)) % 10**11:011d}", "length": 180000, "isStream": False,
+            "isSeekable": True, "position": 0, "sourceName": "youtube",
+        }
+        return self.bot.pomice.Track(track_id=f"ENC:{key}", info=info, track_type=self.bot.pomice.TrackType.YOUTUBE)
+
+    async def get_tracks(self, query, ctx=None, search_type=None):
+        self.calls += 1
+        await asyncio.sleep(LAVALINK_DELAY)
+        if "list=" in query:
+            return FakePlaylist("Bench-liste", [self.track(f"{query}#{i}") for i in range(50)])
+        return [self.track(query)]
+
+
+class FakeSpotify:
+    def track(self, track_id):
+        time.sleep(SPOTIFY_DELAY)
+        return {"name": f"Song {track_id}", "artists": [{"name": "Artist"}], "external_ids": {"isrc": f"NO{track_id}"}}
+
+
+class FakeMessage:
+    async def delete(self, delay=None):
+        pass
+
+
+class FakeCtx:
+    guild = type("Guild", (), {"id": 1, "name": "bench"})()
+    author = type("Author", (), {"id": 2, "name": "bench"})()
+    message = FakeMessage()
+
+    async def send(self, *args, **kwargs):
+        pass
+
+
+QUERIES = [
+    ("Søk", lambda i: f"artist {i} - song {i}"),
+    ("YouTube", lambda i: f"https://youtu.be/{i:011d}"),
+    ("YouTube-spilleliste", lambda i: f"https://www.youtube.com/playlist?list=PLbench{i}"),
+    ("Spotify", lambda i: f"https://open.spotify.com/track/bench{i}"),
+]
+
+
+async def main(rounds: int):
+    bot = load()
+    await bot.init_cache_db()
+    node = FakeNode(bot)
+    bot.pomice.NodePool._nodes = {"bench": node}
+    bot.sp = FakeSpotify()
+
+    async def enqueue_entries(ctx, vc, entries, *, announce):
+        await asyncio.sleep(ENQUEUE_DELAY)
+
+    bot.enqueue_entries = enqueue_entries
+    ctx = FakeCtx()
+    for phase in ("kald", "varm"):
+        for resolver in bot.source_resolvers.values():
+            resolver.calls = resolver.errors = 0
+            resolver.total_time = 0.0
+        node.calls = 0
+        for label, make_query in QUERIES:
+            for i in range(rounds):
+                query = make_query(i)
+                source, media_id = bot.parse_media_url(query) or (None, None)
+                resolver = bot.source_resolvers.get(source) or bot.source_resolvers[None]
+                await bot.run_resolver(ctx, None, resolver, query, media_id)
+        print(f"{phase}: {node.calls} Lavalink-kall")
+        for resolver in dict.fromkeys(bot.source_resolvers.values()):
+            if resolver.calls:
+                print(f"  {resolver.label:<22} {resolver.calls:3} kall · {resolver.avg_ms:6.1f} ms snitt · {resolver.errors} feil")
+    await bot.shutdown_cache()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20))
@@ -0,0 +1,73 @@
+"""Korpus for canonical_query: sjekker forventede nøkler og sammenligner treffraten med rå søkestrenger.
+
+    python scripts/canonical_keys.py
+"""
+import sys
+
+from _onalbot import load
+
+# (inndata, forventet kanonisk nøkkel). Varianter av samme sang står etter hverandre.
+CORPUS = [
+    ("https://www.youtube.com/watch?v=dQw4w9WgXcQ", "youtube:dQw4w9WgXcQ"),
+    ("https://youtu.be/dQw4w9WgXcQ", "youtube:dQw4w9WgXcQ"),
+    ("https://youtu.be/dQw4w9WgXcQ?si=AbCdEf123", "youtube:dQw4w9WgXcQ"),
+    ("https://m.youtube.com/watch?v=dQw4w9WgXcQ&feature=share", "youtube:dQw4w9WgXcQ"),
+    ("https://music.youtube.com/watch?v=dQw4w9WgXcQ", "youtube:dQw4w9WgXcQ"),
+    ("youtube.com/watch?v=dQw4w9WgXcQ&t=42", "youtube:dQw4w9WgXcQ"),
+    ("https://www.youtube.com/shorts/dQw4w9WgXcQ", "youtube:dQw4w9WgXcQ"),
+    ("https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ", "youtube:dQw4w9WgXcQ"),
+    ("https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL1234567890", "youtube:playlist:PL1234567890"),
+    ("https://www.youtube.com/playlist?list=PL1234567890", "youtube:playlist:PL1234567890"),
+    ("https://open.spotify.com/track/3n3Ppam7vgaVa1iaRUc9Lp", "spotify:track:3n3Ppam7vgaVa1iaRUc9Lp"),
+    ("https://open.spotify.com/intl-no/track/3n3Ppam7vgaVa1iaRUc9Lp?si=abc", "spotify:track:3n3Ppam7vgaVa1iaRUc9Lp"),
+    ("spotify:track:3n3Ppam7vgaVa1iaRUc9Lp", "spotify:track:3n3Ppam7vgaVa1iaRUc9Lp"),
+    ("https://open.spotify.com/album/4aawyAB9vmqN3uQ7FjRGTy", "spotify:album:4aawyAB9vmqN3uQ7FjRGTy"),
+    ("https://music.apple.com/no/album/flowers/1663973555?i=1663973562", "apple:song:1663973562"),
+    ("https://music.apple.com/us/song/flowers/1663973562", "apple:song:1663973562"),
+    ("https://music.apple.com/no/album/endless-summer-vacation/1663973555", "apple:album:1663973555"),
+    ("Miley Cyrus - Flowers", "ytsearch:miley cyrus flowers"),
+    ("miley cyrus flowers", "ytsearch:miley cyrus flowers"),
+    ("Miley Cyrus – Flowers (Official Video)", "ytsearch:miley cyrus flowers"),
+    ("  MILEY CYRUS   FLOWERS [HD] ", "ytsearch:miley cyrus flowers"),
+    ("Miley Cyrus - Flowers (Official Music Video)", "ytsearch:miley cyrus flowers"),
+    ("ytsearch:Miley Cyrus Flowers", "ytsearch:miley cyrus flowers"),
+    ("Don't Stop Me Now", "ytsearch:dont stop me now"),
+    ("Dont stop me now", "ytsearch:dont stop me now"),
+    ("Don’t Stop Me Now (Lyrics)", "ytsearch:dont stop me now"),
+    ("Beyoncé Halo", "ytsearch:beyoncé halo"),
+    ("beyoncé - halo", "ytsearch:beyoncé halo"),
+    ("scsearch:Lofi Beats", "scsearch:lofi beats"),
+    ("https://soundcloud.com/artist/track", "https://soundcloud.com/artist/track"),
+]
+
+
+def hit_rate(keys: list[str]) -> float:
+    # Kald cache: første gang en nøkkel sees er bom, resten er treff.
+    seen = set()
+    hits = 0
+    for key in keys:
+        hits += key in seen
+        seen.add(key)
+    return hits / len(keys)
+
+
+def main() -> int:
+    bot = load()
+    failures = 0
+    for query, expected in CORPUS:
+        key = bot.canonical_query(query)
+        if key != expected:
+            failures += 1
+            print(f"FEIL  {query!r}\n      fikk {key!r}, forventet {expected!r}")
+    print(f"{len(CORPUS) - failures}/{len(CORPUS)} nøkler som forventet")
+
+    queries = [query for query, _ in CORPUS]
+    # Før kanoniske nøkler var cachenøkkelen selve søkestrengen.
+    raw = hit_rate(queries)
+    canonical = hit_rate([bot.canonical_query(query) for query in queries])
+    print(f"Treffrate i korpuset: rå søkestreng {raw:.0%}, kanonisk nøkkel {canonical:.0%}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
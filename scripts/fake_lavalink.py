@@ -0,0 +1,211 @@
+"""Node-failover mot falske Lavalink-servere som drepes midt i et spor.
+
+Starter én eller to minimale Lavalink v4-servere (versjon, websocket, player-PATCH) med aiohttp,
+spiller et spor på den første og dreper den. Sjekker at NodeWatchdog flytter spilleren
+(til den andre noden, eller til samme node når den er tilbake) og fortsetter fra sist kjente
+posisjon, uten å røre køen eller now playing.
+
+    python scripts/fake_lavalink.py
+"""
+import asyncio
+import json
+import sys
+import time
+
+from aiohttp import web
+
+from _onalbot import load
+
+GUILD_ID = 42
+PORTS = (23331, 23332)
+
+
+class FakeLavalink:
+    def __init__(self, port: int, session_id: str):
+        self.port = port
+        self.session_id = session_id
+        self.patches: list[dict] = []
+        self._sockets: list[web.WebSocketResponse] = []
+        self._runner: web.AppRunner | None = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/version", lambda request: web.Response(text="4.0.0", content_type="text/plain"))
+        app.router.add_get("/v4/websocket", self._websocket)
+        app.router.add_patch("/v4/sessions/{session}/players/{guild}", self._patch_player)
+        app.router.add_patch("/v4/sessions/{session}", lambda request: web.json_response({}))
+        app.router.add_delete("/v4/sessions/{session}/players/{guild}", lambda request: web.Response(status=204))
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", self.port).start()
+
+    async def _websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._sockets.append(ws)
+        await ws.send_str(json.dumps({"op": "ready", "sessionId": self.session_id, "resumed": False}))
+        async for _ in ws:
+            pass
+        return ws
+
+    async def _patch_player(self, request):
+        # Som ekte Lavalink: en gammel sesjon (fra før omstart) finnes ikke lenger.
+        if request.match_info["session"] != self.session_id:
+            return web.json_response({"message": "Session not found"}, status=404)
+        self.patches.append(await request.json())
+        return web.json_response({})
+
+    def played(self) -> list[tuple[str, int]]:
+        return [(data["encodedTrack"], int(data["position"])) for data in self.patches if "encodedTrack" in data]
+
+    async def kill(self):
+        for ws in self._sockets:
+            await ws.close()
+        if self._runner:
+            await self._runner.cleanup()
+
+
+class FakeBot:
+    user = type("User", (), {"id": 1})()
+
+    def add_listener(self, *args):
+        pass
+
+    async def wait_until_ready(self):
+        pass
+
+    async def change_presence(self, **kwargs):
+        pass
+
+
+class FakeGuild:
+    id = GUILD_ID
+    name = "fake"
+    voice_client = None
+
+    def get_channel(self, channel_id):
+        return None
+
+    def get_member(self, member_id):
+        return None
+
+
+class FakeChannel:
+    id = 7
+    rtc_region = None
+    guild = FakeGuild()
+
+
+class FakeCtx:
+    guild = FakeGuild()
+    author = None
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message=None, **kwargs):
+        self.sent.append(message)
+
+
+async def close_nodes(bot):
+    for node in list(bot.pomice.NodePool._nodes.values()):
+        if node._task:
+            node._task.cancel()
+        try:
+            await node._websocket.close()
+        except Exception:
+            pass
+        await node._session.close()
+    bot.pomice.NodePool._nodes.clear()
+
+
+async def scenario(bot, *, second_node: bool) -> list[str]:
+    name = "to noder" if second_node else "én node som kommer tilbake"
+    errors = []
+    first = FakeLavalink(PORTS[0], "first")
+    second = FakeLavalink(PORTS[1], "second")
+    await first.start()
+    if second_node:
+        await second.start()
+        bot.LAVALINK_NODES = f"http://pw@127.0.0.1:{PORTS[0]},http://pw@127.0.0.1:{PORTS[1]}"
+    else:
+        bot.LAVALINK_NODES = f"http://pw@127.0.0.1:{PORTS[0]}"
+    try:
+        if not await bot.connect_lavalink():
+            return [f"{name}: kom ikke i gang"]
+        await asyncio.sleep(0.2)  # vent på "ready"
+
+        player = bot.OnalPlayer(bot.bot, FakeChannel(), node=bot.pomice.NodePool._nodes["onalbot-1"])
+        player.node._players[GUILD_ID] = player
+        player._is_connected = True
+        player._voice_state = {"sessionId": "voice", "event": {"token": "t", "endpoint": "e"}}
+        await player._refresh_endpoint_uri("first")
+
+        track = bot.QueueEntry("Fake", encoded="ENC", length=200_000, identifier="x").to_track(FakeCtx())
+        ctx = FakeCtx()
+        bot.track_data[GUILD_ID] = (track, ctx)
+        queue = bot.get_guild_queue(GUILD_ID)
+        queue.extend([bot.QueueEntry(f"Neste {i}", encoded="ENC", length=1000) for i in range(2)])
+
+        await player.play(track, start=30_000)
+        player._last_position, player._last_update = 30_000, time.time() * 1000
+        await asyncio.sleep(1.0)
+        expected = int(player.position)
+        await first.kill()  # noden dør midt i sporet
+        await asyncio.sleep(0.3)
+        if player.lost_at is None and not second_node:
+            errors.append(f"{name}: spilleren ble ikke markert som uten node")
+
+        target = second
+        if not second_node:
+            await asyncio.sleep(3)  # noden er borte en stund
+            target = first = FakeLavalink(PORTS[0], "first-restarted")
+            await first.start()
+
+        # pomice venter tilfeldig 0-14 s mellom hvert nytt tilkoblingsforsøk, så samme node kan bruke en stund.
+        deadline = time.monotonic() + 60
+        while player.lost_at is not None and time.monotonic() < deadline:
+            await asyncio.sleep(0.2)
+
+        played = target.played()
+        print(f"{name}: flyttet til {player.node._identifier}, spilt på ny node: {played}, posisjon nå {player.position:.0f}")
+        if player.lost_at is not None or not played:
+            errors.append(f"{name}: spilleren ble ikke flyttet")
+        else:
+            encoded, position = played[-1]
+            if encoded != "ENC" or abs(position - expected) > 500:
+                errors.append(f"{name}: fortsatte på {position} ms, forventet ~{expected} ms")
+            if player.position - position > 1500:
+                errors.append(f"{name}: posisjonen hoppet fram til {player.position:.0f} ms etter flytting")
+        if len(queue) != 2 or bot.track_data.get(GUILD_ID, (None,))[0] is not track:
+            errors.append(f"{name}: køen eller now playing ble endret")
+    finally:
+        bot.track_data.pop(GUILD_ID, None)
+        bot.get_guild_queue(GUILD_ID).clear()
+        await close_nodes(bot)
+        await first.kill()
+        if second_node:
+            await second.kill()
+    return errors
+
+
+async def main() -> int:
+    bot = load()
+    bot.bot = FakeBot()
+    bot.LAVALINK_FAILOVER_RETRY = 0.5
+    await bot.init_cache_db()
+    errors = []
+    try:
+        errors += await scenario(bot, second_node=True)
+        errors += await scenario(bot, second_node=False)
+    finally:
+        await bot.queue_store.close()
+        await bot.shutdown_cache()
+    for error in errors:
+        print(f"FEIL: {error}")
+    print("OK" if not errors else f"{len(errors)} feil")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,61 @@
+"""Sjekker at Retry-After fra en 429 faktisk når spotify_call, mot en lokal server som svarer 429.
+
+    python scripts/spotify_retry_after.py
+"""
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from _onalbot import load
+
+RETRY_AFTER = 7
+
+
+class RateLimited(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps({"error": {"status": 429, "message": "API rate limit exceeded"}}).encode()
+        self.send_response(429)
+        self.send_header("Retry-After", str(RETRY_AFTER))
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def retry_after(bot, client) -> float | None:
+    try:
+        client.track("4uLU6hMCjMI75M1A2tKUQC")
+    except bot.spotipy.SpotifyException as e:
+        return bot.spotify_retry_after(e)
+    raise AssertionError("serveren svarte ikke 429")
+
+
+def main() -> int:
+    bot = load()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RateLimited)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    prefix = f"http://127.0.0.1:{server.server_port}/v1/"
+    try:
+        # Slik klienten var satt opp før: urllib3 gjør 429 om til RetryError, og headerne forsvinner.
+        old = bot.spotipy.Spotify(auth="token", requests_timeout=10, retries=0, status_retries=0)
+        old.prefix = prefix
+        client = bot.spotify_client(auth="token")
+        client.prefix = prefix
+        old_wait, wait = retry_after(bot, old), retry_after(bot, client)
+    finally:
+        server.shutdown()
+    print(f"Retry-After lest med retries=0/status_retries=0: {old_wait}")
+    print(f"Retry-After lest med spotify_client:              {wait}")
+    if wait != RETRY_AFTER:
+        print(f"FEIL: forventet {RETRY_AFTER}")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())